@@ -1,62 +1,790 @@
 import sys
-from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QPainter, QColor, QPen, QBrush
+import os
+import csv
+import math
+import mmap
+import argparse
+import struct
+import time
+from array import array
+import numpy as np
+from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget, QFileDialog, QMessageBox
+from PyQt6.QtCore import Qt, QRect, QRectF, QPoint, QPointF, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from PyQt6.QtGui import QPainter, QColor, QPen, QBrush, QPixmap, QImage, QRegion, QKeySequence, QActionGroup
+
+
+STAMP_PEN_WIDTH = 2    # Толщина контура фигур штампа.
+GRID_CELL_SIZE = 256    # Сторона ячейки пространственного индекса.
+TILE_SIZE = 256    # Сторона плитки при фоновой растеризации.
+MIN_VIEW_SCALE, MAX_VIEW_SCALE = 0.001, 8.0    # Пределы масштаба просмотра.
+LOD_DETAIL_PX = 24    # Штамп меньше этого размера на экране рисуется меткой.
+LOD_MAX_DETAIL = 4000    # Сколько штампов в кадре еще рисуется полностью.
+LOD_MAX_MARKS = 20000    # Сколько меток в кадре еще рисуется по одной; больше - карта плотности.
+LOD_MAX_DETAIL_PIXELS = 500_000_000    # Сколько пикселей экрана в сумме могут занять полностью нарисованные штампы.
+LOD_MAX_MARK_PIXELS = 1_000_000_000    # То же для меток; при увеличении штампы сильно перекрываются.
+DENSITY_BIN_PX = 4    # Минимальный размер метки карты плотности на экране.
+SESSION_MAGIC = b"KGCLICK1"    # Сигнатура файла сессии.
+SESSION_HEADER = struct.Struct("<8sQ")    # Заголовок файла: сигнатура и число кликов.
+SESSION_FILTER = "Сессии рисования (*.clicks);;Все файлы (*)"
+IMPORT_FILTER = "Потоки кликов (*.clicks *.csv *.txt *.bin);;Все файлы (*)"
+IMPORT_CHUNK_SIZE = 2000    # Сколько кликов читается и добавляется за раз.
+IMPORT_STEP_BUDGET = 0.012    # Сколько секунд импорт может занимать за один проход цикла событий.
+
+
+def split_into_layers(points, extent):    # Разбиение штампов на подряд идущие группы, внутри которых они не перекрываются.
+    layer = []
+    occupied = {}    # Ячейка сетки со стороной extent -> центр штампа; в ячейке не больше одного штампа группы
+    for x, y in points:
+        cx, cy = x // extent, y // extent
+        neighbours = (occupied.get((cx + dx, cy + dy)) for dx in (-1, 0, 1) for dy in (-1, 0, 1))
+        if any(other and abs(other[0] - x) < extent and abs(other[1] - y) < extent for other in neighbours):
+            yield layer    # Новый штамп перекрыл штамп текущей группы - начинаем следующую
+            layer = []
+            occupied = {}
+        layer.append((x, y))
+        occupied[(cx, cy)] = (x, y)
+    if layer:
+        yield layer
+
+
+def draw_stamps_batched(painter, points, outer_size, extent):    # Отрисовка штампов пачками: одна смена пера и кисти на цвет.
+    circle_diameter = outer_size
+    inner_size = int(circle_diameter / 1.414)
+    blue_pen, blue_brush = QPen(QColor(0, 0, 255), STAMP_PEN_WIDTH), QBrush(QColor(0, 0, 255))
+    white_pen, white_brush = QPen(QColor(255, 255, 255), STAMP_PEN_WIDTH), QBrush(QColor(255, 255, 255))
+
+    # Порядок наложения сохраняется: пачки собираются только из штампов, которые не перекрывают друг друга
+    for layer in split_into_layers(points, extent):
+        outer_rects = []
+        circles = []
+        inner_rects = []
+        for x, y in layer:
+            outer_rects.append(QRect(int(x - outer_size/2), int(y - outer_size/2), outer_size, outer_size))
+            circles.append(QRect(int(x - circle_diameter/2), int(y - circle_diameter/2), circle_diameter, circle_diameter))
+            inner_rects.append(QRect(int(x - inner_size/2), int(y - inner_size/2), inner_size, inner_size))
+
+        painter.setPen(blue_pen)
+        painter.setBrush(blue_brush)
+        painter.drawRects(outer_rects)
+
+        # Окружности рисуются отдельными вызовами: растровый движок Qt заливает один большой
+        # QPainterPath из многих эллипсов заметно медленнее, чем те же эллипсы по одному
+        painter.setPen(white_pen)
+        painter.setBrush(white_brush)
+        for rect in circles:
+            painter.drawEllipse(rect)
+
+        painter.setPen(blue_pen)
+        painter.setBrush(blue_brush)
+        painter.drawRects(inner_rects)
+
+
+def render_stamps(painter, points, mode, outer_size, stamp):    # Отрисовка штампов; stamp - готовое изображение (QPixmap или QImage).
+    half = outer_size // 2 + STAMP_PEN_WIDTH
+    if mode == "pixmap":
+        draw = painter.drawImage if isinstance(stamp, QImage) else painter.drawPixmap
+        for x, y in points:
+            draw(x - half, y - half, stamp)
+        return
+
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)   # Включение сглаживания
+    if mode == "batched":
+        draw_stamps_batched(painter, points, outer_size, 2 * half)
+    else:
+        for x, y in points:
+            draw_stamp(painter, x, y, outer_size)
+
+
+class TileSignals(QObject):    # Сигналы фоновой задачи (QRunnable сам сигналы не поддерживает).
+    finished = pyqtSignal(tuple, int, QImage)
+
+
+class TileRenderer(QRunnable):    # Растеризация одной плитки в отдельном потоке.
+    def __init__(self, key, generation, points, mode, outer_size, stamp, dpr):
+        super().__init__()
+        self.key = key
+        self.generation = generation
+        self.points = points    # Снимок штампов плитки, сделанный в потоке интерфейса.
+        self.mode = mode
+        self.outer_size = outer_size
+        self.stamp = stamp    # QImage: QPixmap вне потока интерфейса использовать нельзя.
+        self.dpr = dpr
+        self.signals = TileSignals()
+
+    def run(self):
+        tile_x, tile_y = self.key
+        image = QImage(round(TILE_SIZE * self.dpr), round(TILE_SIZE * self.dpr), QImage.Format.Format_ARGB32_Premultiplied)
+        image.setDevicePixelRatio(self.dpr)
+        image.fill(Qt.GlobalColor.transparent)
+
+        painter = QPainter(image)
+        painter.translate(-tile_x * TILE_SIZE, -tile_y * TILE_SIZE)
+        render_stamps(painter, self.points, self.mode, self.outer_size, self.stamp)
+        painter.end()
+        self.signals.finished.emit(self.key, self.generation, image)
+
+
+class ClickStorage:    # Компактное хранилище кликов: пары x, y подряд в массиве int32.
+    def __init__(self, data=None):
+        self.data = data if data is not None else array("i")
+
+    def __len__(self):
+        return len(self.data) // 2
+
+    def __getitem__(self, index):    # Координаты клика с номером index в виде (x, y).
+        return self.data[2 * index], self.data[2 * index + 1]
+
+    def __iter__(self):
+        data = self.data
+        return zip(data[0::2], data[1::2])
+
+    def points(self, start=0, stop=None):    # Клики с номерами из диапазона [start, stop).
+        data = self.data
+        stop = len(self) if stop is None else stop
+        return zip(data[2 * start:2 * stop:2], data[2 * start + 1:2 * stop:2])
+
+    def append(self, x, y):
+        self.data.append(x)
+        self.data.append(y)
+
+    def extend(self, data):    # Добавление пачки кликов (пары x, y подряд).
+        self.data.extend(data)
+
+    def save(self, filename):    # Запись сессии: заголовок и сырые пары int32 (little-endian).
+        data = self.data
+        if sys.byteorder != "little":
+            data = array("i", data)
+            data.byteswap()
+        with open(filename, "wb") as file:
+            file.write(SESSION_HEADER.pack(SESSION_MAGIC, len(self)))
+            data.tofile(file)
+
+    @classmethod
+    def load(cls, filename):    # Загрузка сессии через отображение файла в память, без разбора по точкам.
+        with open(filename, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if len(mapped) < SESSION_HEADER.size:
+                    raise ValueError(f"Файл слишком короткий: {filename}")
+                magic, count = SESSION_HEADER.unpack_from(mapped)
+                if magic != SESSION_MAGIC:
+                    raise ValueError(f"Неизвестный формат файла: {filename}")
+                end = SESSION_HEADER.size + count * 2 * array("i").itemsize
+                if len(mapped) < end:
+                    raise ValueError(f"Файл поврежден: {filename}")
+
+                data = array("i")
+                with memoryview(mapped) as view:
+                    data.frombytes(view[SESSION_HEADER.size:end])
+        if sys.byteorder != "little":
+            data.byteswap()
+        return cls(data)
+
+
+def draw_stamp(painter, x, y, outer_size):    # Векторная отрисовка одного штампа с центром в точке (x, y).
+    circle_diameter = outer_size  # Диаметр окружности равен стороне квадрата
+
+    # Диагональ внутреннего квадрата равна диаметру окружности
+    # Для квадрата: диагональ = сторона * √2 ≈ сторона * 1.414
+    inner_size = int(circle_diameter / 1.414)  # Сторона внутреннего квадрата
+
+    # Рисуем внешний синий квадрат
+    painter.setPen(QPen(QColor(0, 0, 255), STAMP_PEN_WIDTH))
+    painter.setBrush(QBrush(QColor(0, 0, 255)))
+    painter.drawRect(
+        int(x - outer_size/2),
+        int(y - outer_size/2),
+        outer_size,
+        outer_size
+    )
+
+    # Рисуем белую окружность (диаметр = стороне внешнего квадрата)
+    painter.setPen(QPen(QColor(255, 255, 255), STAMP_PEN_WIDTH))
+    painter.setBrush(QBrush(QColor(255, 255, 255)))
+    painter.drawEllipse(
+        int(x - circle_diameter/2),
+        int(y - circle_diameter/2),
+        circle_diameter,
+        circle_diameter
+    )
+
+    # Рисуем внутренний синий квадрат (диагональ = диаметру окружности)
+    painter.setPen(QPen(QColor(0, 0, 255), STAMP_PEN_WIDTH))
+    painter.setBrush(QBrush(QColor(0, 0, 255)))
+    painter.drawRect(
+        int(x - inner_size/2),
+        int(y - inner_size/2),
+        inner_size,
+        inner_size
+    )
+
+
+def iter_click_chunks(filename, chunk_size=IMPORT_CHUNK_SIZE):    # Потоковое чтение кликов пачками array("i") с парами x, y.
+    # Форматы: файл сессии (с сигнатурой), CSV/текст "x,y" по строке на клик, иначе - сырые пары int32 little-endian
+    if chunk_size <= 0:
+        raise ValueError(f"Размер пачки должен быть положительным: {chunk_size}")
+    with open(filename, "rb") as file:
+        is_session = file.read(len(SESSION_MAGIC)) == SESSION_MAGIC
+
+    if is_session or os.path.splitext(filename)[1].lower() not in (".csv", ".txt"):
+        with open(filename, "rb") as file:
+            if is_session:
+                file.seek(SESSION_HEADER.size)
+            pair_size = 2 * array("i").itemsize
+            while True:
+                raw = file.read(chunk_size * pair_size)
+                if not raw:
+                    return
+                chunk = array("i")
+                chunk.frombytes(raw[:len(raw) - len(raw) % pair_size])    # Неполная пара в конце файла отбрасывается.
+                if sys.byteorder != "little":
+                    chunk.byteswap()
+                yield chunk
+
+    with open(filename, newline="", encoding="utf-8") as file:
+        chunk = array("i")
+        for row in csv.reader(file):
+            try:
+                chunk.append(int(float(row[0])))
+                chunk.append(int(float(row[1])))
+            except (ValueError, IndexError, OverflowError):    # Заголовок, пустые, битые и не влезающие в int32 строки пропускаются.
+                del chunk[len(chunk) - len(chunk) % 2:]
+                continue
+            if len(chunk) >= 2 * chunk_size:
+                yield chunk
+                chunk = array("i")
+        if chunk:
+            yield chunk
+
+
+class StampGrid:    # Пространственный индекс: ячейка сетки -> номера кликов, чьи центры в нее попали.
+    def __init__(self, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self._levels = {}    # Пирамида счетчиков: уровень -> {ячейка уровня: число кликов}; ячейка уровня L = 2**L ячеек.
+
+    def cell_of(self, x, y):
+        return x // self.cell_size, y // self.cell_size
+
+    def insert(self, index, x, y):
+        cx, cy = self.cell_of(x, y)
+        self.cells.setdefault((cx, cy), []).append(index)
+        for level, counts in self._levels.items():
+            key = (cx >> level, cy >> level)
+            counts[key] = counts.get(key, 0) + 1
+
+    def remove(self, index, x, y):
+        cell = self.cell_of(x, y)
+        bucket = self.cells.get(cell)
+        if bucket and index in bucket:
+            bucket.remove(index)
+            if not bucket:
+                del self.cells[cell]
+            for level, counts in self._levels.items():
+                key = (cell[0] >> level, cell[1] >> level)
+                counts[key] -= 1
+                if not counts[key]:
+                    del counts[key]
+
+    def clear(self):
+        self.cells.clear()
+        self._levels.clear()
+
+    def rebuild(self, clicks):    # Построение индекса заново по всему хранилищу кликов.
+        cells = {}
+        if len(clicks):
+            # Раскладка по ячейкам без цикла по точкам: номер ячейки для каждого клика,
+            # затем устойчивая сортировка (порядок кликов внутри ячейки сохраняется)
+            keys = np.frombuffer(clicks.data, dtype=np.intc).reshape(-1, 2) // self.cell_size
+            low = keys.min(axis=0)
+            height = int(keys[:, 1].max() - low[1]) + 1
+            linear = (keys[:, 0] - low[0]).astype(np.int64) * height + (keys[:, 1] - low[1])
+            if linear.max() < 4 * len(linear):
+                counts = np.bincount(linear)
+                used = np.flatnonzero(counts)
+                rank = np.zeros(len(counts), dtype=np.int64)
+                rank[used] = np.arange(len(used))
+                cell_ids = rank[linear]
+            else:    # Клики разбросаны слишком широко для таблицы по всем ячейкам.
+                used, cell_ids = np.unique(linear, return_inverse=True)
+            if len(used) <= 1 << 16:
+                cell_ids = cell_ids.astype(np.uint16)    # Для 16-битных ключей numpy сортирует поразрядно.
+            order = np.argsort(cell_ids, kind="stable")
+            bounds = np.searchsorted(cell_ids[order], np.arange(len(used) + 1)).tolist()
+            cell_x = (used // height + low[0]).tolist()
+            cell_y = (used % height + low[1]).tolist()
+            indices = order.tolist()
+            for cx, cy, start, stop in zip(cell_x, cell_y, bounds, bounds[1:]):
+                cells[(cx, cy)] = indices[start:stop]
+        self.cells = cells
+        self._levels = {}
+
+    def cells_in_rect(self, rect):    # Непустые ячейки, которые задевает прямоугольник: пары (ячейка, номера кликов).
+        left, top = self.cell_of(rect.left(), rect.top())
+        right, bottom = self.cell_of(rect.right(), rect.bottom())
+        if (right - left + 1) * (bottom - top + 1) > len(self.cells):
+            # Прямоугольник больше заполненной части сетки - дешевле пройти по непустым ячейкам
+            return [(cell, bucket) for cell, bucket in self.cells.items()
+                    if left <= cell[0] <= right and top <= cell[1] <= bottom]
+        found = []
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket:
+                    found.append(((cx, cy), bucket))
+        return found
+
+    def density(self, level):    # Число кликов в ячейках уровня level; уровни строятся по требованию.
+        counts = self._levels.get(level)
+        if counts is None:
+            counts = {}
+            if level == 0:
+                for cell, bucket in self.cells.items():
+                    counts[cell] = len(bucket)
+            else:
+                for (cx, cy), count in self.density(level - 1).items():
+                    key = (cx >> 1, cy >> 1)
+                    counts[key] = counts.get(key, 0) + count
+            self._levels[level] = counts
+        return counts
+
+    def density_in_rect(self, rect, level):    # Непустые ячейки уровня level, которые задевает прямоугольник: пары (ячейка, число).
+        counts = self.density(level)
+        size = self.cell_size << level
+        left, top = rect.left() // size, rect.top() // size
+        right, bottom = rect.right() // size, rect.bottom() // size
+        if (right - left + 1) * (bottom - top + 1) > len(counts):
+            return [(cell, count) for cell, count in counts.items()
+                    if left <= cell[0] <= right and top <= cell[1] <= bottom]
+        found = []
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                count = counts.get((cx, cy))
+                if count:
+                    found.append(((cx, cy), count))
+        return found
+
+    def query(self, rect):    # Номера кликов из всех ячеек, которые задевает прямоугольник (кандидаты).
+        found = []
+        for _, bucket in self.cells_in_rect(rect):
+            found.extend(bucket)
+        return found
 
 
 class DrawingWidget(QWidget):     # Виджет для рисования.
     def __init__(self):
         super().__init__()
-        self.click_positions = []     # Список для хранения позиций кликов мыши.
+        self.click_positions = ClickStorage()     # Хранилище позиций кликов мыши.
+        self.stamp_index = StampGrid()     # Индекс по позициям кликов для выборки по области.
+        self.stamp_size = 150     # Сторона внешнего квадрата штампа.
+        self._stamp_pixmap = None     # Закэшированное изображение штампа.
+        self._stamp_key = None     # Размер и DPI, для которых построен кэш.
+        self._zoomed_stamp = None     # Штамп, отрисованный в разрешении текущего масштаба просмотра.
+        self._zoomed_key = None     # Размер, DPI и масштаб, для которых он построен.
+        self.stamp_mode = "pixmap"     # "pixmap" - готовое изображение, "batched" - пачками по цветам, "vector" - по одному.
+        self.paint_mode = "layered"     # "layered" - через буфер, "tiled" - плитками в фоне, "direct" - все штампы заново.
+        self._backing = None     # Буфер (QImage) с уже растеризованными штампами.
+        self._backing_key = None     # Размер штампа и DPI, для которых построен буфер.
+        self._backing_count = 0     # Сколько кликов из списка уже нарисовано в буфере.
+        self._stamp_image = None     # Копия штампа в QImage для фоновых потоков.
+        self._tiles = {}     # Готовые плитки: (столбец, строка) -> QImage (пустой QImage - в плитке нет штампов).
+        self._pending_tiles = {}     # Плитки в работе: (столбец, строка) -> номер задачи.
+        self._tile_generation = 0     # Счетчик задач; результаты устаревших задач отбрасываются.
+        self._tiles_key = None     # Режим, размер штампа и DPI, для которых построены плитки.
+        self._tiles_count = 0     # Сколько кликов уже учтено в плитках.
+        self.view_scale = 1.0     # Масштаб просмотра: экран = мир * масштаб + сдвиг.
+        self.view_offset = QPointF(0, 0)     # Сдвиг просмотра в пикселях экрана.
+        self._pan_origin = None     # Точка, с которой началось перетаскивание холста.
         self.setMinimumSize(800, 600)    # Установка минимального размера виджета.
 
+    def stamp_half_extent(self):    # Расстояние от центра штампа до края его изображения (с учетом пера).
+        return self.stamp_size // 2 + STAMP_PEN_WIDTH
+
+    def stamp_rect(self, x, y):    # Прямоугольник, который занимает штамп с центром в (x, y).
+        half = self.stamp_half_extent()
+        return QRect(x - half, y - half, 2 * half, 2 * half)
+
+    def add_click(self, x, y):    # Добавление клика в хранилище и в индекс; возвращает область нового штампа.
+        self.stamp_index.insert(len(self.click_positions), x, y)
+        self.click_positions.append(x, y)
+        return self.stamp_rect(x, y)
+
+    def add_clicks(self, data):    # Добавление пачки кликов (пары x, y подряд) с одной общей перерисовкой.
+        if not data:
+            return
+        start = len(self.click_positions)
+        self.click_positions.extend(data)
+
+        insert = self.stamp_index.insert
+        xs, ys = data[0::2], data[1::2]
+        for index, (x, y) in enumerate(zip(xs, ys), start):
+            insert(index, x, y)
+
+        # Одна перерисовка на всю пачку: область, покрывающая все новые штампы
+        half = self.stamp_half_extent()
+        dirty = QRect(QPoint(min(xs) - half, min(ys) - half), QPoint(max(xs) + half, max(ys) + half))
+        self.update(self.map_rect_to_screen(dirty))
+
+    def import_clicks(self, filename, chunk_size=IMPORT_CHUNK_SIZE):    # Фоновый импорт: по пачке за проход цикла событий Qt.
+        chunks = iter_click_chunks(filename, chunk_size)
+        imported = 0
+        resumed = None    # Когда закончился прошлый проход импорта.
+
+        def step():
+            nonlocal imported, resumed
+            # Между проходами Qt перерисовывает добавленное; это время тоже входит в бюджет,
+            # поэтому пачки добавляются только на остаток (но не меньше одной пачки за проход)
+            started = time.perf_counter()
+            others = started - resumed if resumed is not None else 0.0
+            deadline = started + IMPORT_STEP_BUDGET - others
+            while True:
+                try:
+                    chunk = next(chunks, None)
+                except (OSError, ValueError, csv.Error) as e:    # csv.Error - например, поле длиннее лимита в двоичном файле.
+                    print(f"Ошибка импорта {filename}: {e}")
+                    return
+                if chunk is None:
+                    print(f"Импортировано кликов из {filename}: {imported}")
+                    return
+                self.add_clicks(chunk)
+                imported += len(chunk) // 2
+                if time.perf_counter() >= deadline:
+                    break
+            resumed = time.perf_counter()
+            # Через 1 мс, а не 0: так Qt успевает перерисовать добавленное до следующего прохода
+            QTimer.singleShot(1, step)
+
+        QTimer.singleShot(0, step)
+
+    def save_session(self, filename):    # Сохранение всех кликов в двоичный файл.
+        self.click_positions.save(filename)
+
+    def load_session(self, filename):    # Замена текущих кликов содержимым файла сессии.
+        self.click_positions = ClickStorage.load(filename)
+        self.stamp_index.rebuild(self.click_positions)
+        self._backing = None    # Буфер будет построен заново при следующей отрисовке.
+        self._tiles_key = None    # Плитки тоже.
+        self.update()
+
+    def stamps_in_rect(self, rect):    # Номера штампов, пересекающих прямоугольник, в порядке кликов.
+        half = self.stamp_half_extent()
+        area = rect.adjusted(-half, -half, half, half)
+        found = []
+        for index in self.stamp_index.query(area):
+            x, y = self.click_positions[index]
+            if rect.intersects(self.stamp_rect(x, y)):
+                found.append(index)
+        found.sort()
+        return found
+
+    def stamp_at(self, x, y):    # Номер верхнего штампа под точкой (x, y) или None.
+        found = self.stamps_in_rect(QRect(x, y, 1, 1))
+        return found[-1] if found else None
+
+    def set_stamp_mode(self, mode):    # Смена способа отрисовки штампов (для сравнения режимов).
+        self.stamp_mode = mode
+        self._backing = None
+        self.update()
+
+    def set_paint_mode(self, mode):    # Смена способа перерисовки виджета.
+        self.paint_mode = mode
+        self.update()
+
+    def draw_stamps(self, painter, points):    # Отрисовка штампов выбранным способом.
+        render_stamps(painter, points, self.stamp_mode, self.stamp_size, self.stamp_pixmap())
+
+    def render_stamp_pixmap(self, ratio):    # Штамп в изображении с плотностью ratio пикселей на единицу холста.
+        half = self.stamp_half_extent()
+        extent = 2 * half
+        pixmap = QPixmap(round(extent * ratio), round(extent * ratio))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.GlobalColor.transparent)
+
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)   # Включение сглаживания
+        draw_stamp(painter, half, half, self.stamp_size)
+        painter.end()
+        return pixmap
+
+    def stamp_pixmap(self):    # Штамп, отрисованный один раз; перестраивается при смене размера или DPI.
+        dpr = self.devicePixelRatioF()
+        key = (self.stamp_size, dpr)
+        if self._stamp_key != key:
+            self._stamp_pixmap = self.render_stamp_pixmap(dpr)
+            self._stamp_image = self._stamp_pixmap.toImage()
+            self._stamp_key = key
+        return self._stamp_pixmap
+
+    def zoomed_stamp_pixmap(self, scale):    # Штамп для просмотра с увеличением: четкий, без растягивания готового изображения.
+        dpr = self.devicePixelRatioF()
+        key = (self.stamp_size, dpr, scale)
+        if self._zoomed_key != key:
+            self._zoomed_stamp = self.render_stamp_pixmap(dpr * scale)
+            self._zoomed_key = key
+        return self._zoomed_stamp
+
+    def sync_backing(self):    # Доводит буфер до актуального состояния: растеризуются только новые клики.
+        dpr = self.devicePixelRatioF()
+        key = (self.stamp_size, dpr)
+        width, height = self.width(), self.height()
+
+        if self._backing is None or self._backing_key != key:
+            self._backing = self._create_backing(width, height, dpr)
+            self._backing_key = key
+            self._backing_count = 0
+        else:
+            old_rect = QRect(0, 0, round(self._backing.width() / dpr), round(self._backing.height() / dpr))
+            if width > old_rect.width() or height > old_rect.height():    # Виджет вырос - расширяем буфер.
+                self._grow_backing(old_rect, max(width, old_rect.width()), max(height, old_rect.height()), dpr)
+
+        if self._backing_count < len(self.click_positions):
+            painter = QPainter(self._backing)
+            self.draw_stamps(painter, self.click_positions.points(self._backing_count))
+            painter.end()
+            self._backing_count = len(self.click_positions)
+
+    def _create_backing(self, width, height, dpr):    # Пустой прозрачный буфер заданного логического размера.
+        image = QImage(round(width * dpr), round(height * dpr), QImage.Format.Format_ARGB32_Premultiplied)
+        image.setDevicePixelRatio(dpr)
+        image.fill(Qt.GlobalColor.transparent)
+        return image
+
+    def _grow_backing(self, old_rect, width, height, dpr):    # Перенос старого буфера в больший и дорисовка открывшейся области.
+        image = self._create_backing(width, height, dpr)
+        painter = QPainter(image)
+        painter.drawImage(0, 0, self._backing)
+
+        # В открывшейся области штампы перерисовываются по порядку, старая часть остается нетронутой
+        exposed = QRegion(0, 0, width, height).subtracted(QRegion(old_rect))
+        painter.setClipRegion(exposed)
+        strips = [
+            QRect(old_rect.width(), 0, width - old_rect.width(), height),    # Полоса справа
+            QRect(0, old_rect.height(), width, height - old_rect.height()),    # Полоса снизу
+        ]
+        indices = set()
+        for rect in strips:
+            if not rect.isEmpty():
+                indices.update(self.stamps_in_rect(rect))
+        clicks = self.click_positions
+        self.draw_stamps(painter, (clicks[index] for index in sorted(indices) if index < self._backing_count))
+        painter.end()
+        self._backing = image
+
+    def tile_rect(self, key):    # Область плитки в координатах виджета.
+        return QRect(key[0] * TILE_SIZE, key[1] * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+
+    def tiles_in_rect(self, rect):    # Плитки, которые задевает прямоугольник.
+        for tile_x in range(rect.left() // TILE_SIZE, rect.right() // TILE_SIZE + 1):
+            for tile_y in range(rect.top() // TILE_SIZE, rect.bottom() // TILE_SIZE + 1):
+                yield tile_x, tile_y
+
+    def sync_tiles(self):    # Дорисовка новых кликов в готовые плитки и перезапуск плиток, которые еще в работе.
+        key = (self.stamp_mode, self.stamp_size, self.devicePixelRatioF())
+        if self._tiles_key != key:
+            self._tiles.clear()
+            self._pending_tiles.clear()    # Результаты уже запущенных задач будут отброшены.
+            self._tiles_key = key
+            self._tiles_count = len(self.click_positions)
+            return
+
+        if self._tiles_count == len(self.click_positions):
+            return
+
+        for x, y in self.click_positions.points(self._tiles_count):
+            for tile in self.tiles_in_rect(self.stamp_rect(x, y)):
+                image = self._tiles.get(tile)
+                if tile in self._pending_tiles:
+                    self.submit_tile(tile)
+                elif image is not None:
+                    if image.isNull():
+                        image = self._create_tile_image()
+                        self._tiles[tile] = image
+                    painter = QPainter(image)
+                    painter.translate(-tile[0] * TILE_SIZE, -tile[1] * TILE_SIZE)
+                    self.draw_stamps(painter, [(x, y)])
+                    painter.end()
+        self._tiles_count = len(self.click_positions)
+
+    def _create_tile_image(self):    # Пустая прозрачная плитка.
+        dpr = self.devicePixelRatioF()
+        image = QImage(round(TILE_SIZE * dpr), round(TILE_SIZE * dpr), QImage.Format.Format_ARGB32_Premultiplied)
+        image.setDevicePixelRatio(dpr)
+        image.fill(Qt.GlobalColor.transparent)
+        return image
+
+    def submit_tile(self, tile):    # Постановка плитки в очередь фоновой растеризации.
+        clicks = self.click_positions
+        points = [clicks[index] for index in self.stamps_in_rect(self.tile_rect(tile))]
+        if not points:
+            self._tiles[tile] = QImage()    # Пустую плитку рисовать незачем.
+            self._pending_tiles.pop(tile, None)
+            return
+
+        self.stamp_pixmap()    # Обновляет self._stamp_image, если нужно.
+        self._tile_generation += 1
+        self._pending_tiles[tile] = self._tile_generation
+        job = TileRenderer(tile, self._tile_generation, points, self.stamp_mode, self.stamp_size,
+                           self._stamp_image, self.devicePixelRatioF())
+        job.signals.finished.connect(self.tile_finished)
+        QThreadPool.globalInstance().start(job)
+
+    def tile_finished(self, tile, generation, image):    # Прием готовой плитки в потоке интерфейса.
+        if self._pending_tiles.get(tile) != generation:
+            return    # Плитка устарела: ее уже перезапустили или сбросили.
+        del self._pending_tiles[tile]
+        self._tiles[tile] = image
+        self.update(self.tile_rect(tile))
+
+    def view_is_identity(self):    # Холст показан 1:1 без сдвига - можно использовать буфер и плитки.
+        return self.view_scale == 1.0 and self.view_offset.isNull()
+
+    def map_to_world(self, point):    # Перевод точки экрана в координаты холста.
+        return (point - self.view_offset) / self.view_scale
+
+    def map_rect_to_world(self, rect):    # Перевод прямоугольника экрана в координаты холста.
+        top_left = self.map_to_world(QPointF(rect.topLeft()))
+        return QRectF(top_left, QRectF(rect).size() / self.view_scale).toAlignedRect()
+
+    def map_rect_to_screen(self, rect):    # Перевод прямоугольника холста в координаты экрана.
+        top_left = QPointF(rect.topLeft()) * self.view_scale + self.view_offset
+        return QRectF(top_left, QRectF(rect).size() * self.view_scale).toAlignedRect().adjusted(-1, -1, 1, 1)
+
+    def zoom_at(self, factor, anchor):    # Изменение масштаба так, чтобы точка anchor на экране осталась на месте.
+        scale = min(max(self.view_scale * factor, MIN_VIEW_SCALE), MAX_VIEW_SCALE)
+        world = self.map_to_world(anchor)
+        self.view_scale = scale
+        self.view_offset = anchor - world * scale
+        self.update()
+
+    def reset_view(self):    # Возврат к масштабу 1:1 без сдвига.
+        self.view_scale = 1.0
+        self.view_offset = QPointF(0, 0)
+        self.update()
+
     def mousePressEvent(self, event):    # Обработчик события нажатия кнопки мыши.
         if event.button() == Qt.MouseButton.LeftButton:    # Проверка, что нажата левая кнопка мыши.
-            self.click_positions.append(event.pos())      # # Добавление позиции клика в список
+            world = self.map_to_world(event.position())
+            dirty = self.add_click(round(world.x()), round(world.y()))      # # Добавление позиции клика в хранилище
+            self.update(self.map_rect_to_screen(dirty))    # Перерисовываем только область нового штампа.
+        elif event.button() in (Qt.MouseButton.MiddleButton, Qt.MouseButton.RightButton):    # Перетаскивание холста.
+            self._pan_origin = event.position()
+
+    def mouseMoveEvent(self, event):    # Сдвиг холста при перетаскивании.
+        if self._pan_origin is not None:
+            position = event.position()
+            self.view_offset += position - self._pan_origin
+            self._pan_origin = position
             self.update()
 
+    def mouseReleaseEvent(self, event):
+        if event.button() in (Qt.MouseButton.MiddleButton, Qt.MouseButton.RightButton):
+            self._pan_origin = None
+
+    def wheelEvent(self, event):    # Масштабирование колесом мыши относительно курсора.
+        steps = event.angleDelta().y() / 120
+        if steps:
+            self.zoom_at(1.25 ** steps, event.position())
+
+    def paint_view(self, painter, rect):    # Отрисовка с масштабом и сдвигом; детализация зависит от размера штампа на экране.
+        scale = self.view_scale
+        half = self.stamp_half_extent()
+        world = self.map_rect_to_world(rect).adjusted(-1, -1, 1, 1)
+        area = world.adjusted(-half, -half, half, half)
+        cell_px = self.stamp_index.cell_size * scale
+        level = max(0, math.ceil(math.log2(DENSITY_BIN_PX / cell_px)))    # Метка карты плотности - не меньше DENSITY_BIN_PX.
+        bins = self.stamp_index.density_in_rect(area, level)
+        visible = sum(count for _, count in bins)    # Оценка сверху числа штампов в кадре.
+        stamp_px = self.stamp_size * scale
+        clicks = self.click_positions
+        # Цена кадра растет с площадью штампов, а не только с их числом; площадь штампа
+        # ограничена областью перерисовки, в пикселях устройства
+        dpr = self.devicePixelRatioF()
+        pixels = visible * min(stamp_px, rect.width()) * min(stamp_px, rect.height()) * dpr * dpr
+
+        if stamp_px >= LOD_DETAIL_PX and visible <= LOD_MAX_DETAIL and pixels <= LOD_MAX_DETAIL_PIXELS:
+            # Полная детализация: рисуем штампы в координатах холста
+            painter.translate(self.view_offset)
+            painter.scale(scale, scale)
+            painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+            if scale <= 1:
+                mode, stamp = self.stamp_mode, self.stamp_pixmap()
+            else:
+                # При увеличении обычное изображение размылось бы, а векторная отрисовка
+                # крупных штампов слишком дорога - берется изображение под текущий масштаб
+                mode, stamp = "pixmap", self.zoomed_stamp_pixmap(scale)
+            render_stamps(painter, (clicks[index] for index in self.stamps_in_rect(world)), mode,
+                          self.stamp_size, stamp)
+        elif visible <= LOD_MAX_MARKS and pixels <= LOD_MAX_MARK_PIXELS:
+            # Каждый штамп - закрашенный квадрат (при сильном уменьшении - один пиксель)
+            side = max(1, round(stamp_px))
+            offset_x, offset_y = self.view_offset.x(), self.view_offset.y()
+            marks = []
+            for _, bucket in self.stamp_index.cells_in_rect(area):
+                for index in bucket:
+                    x, y = clicks[index]
+                    marks.append(QRect(round(x * scale + offset_x - side / 2), round(y * scale + offset_y - side / 2),
+                                       side, side))
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(QBrush(QColor(0, 0, 255)))
+            painter.drawRects(marks)
+        else:
+            self.paint_density(painter, area, level, bins)
+
+    def paint_density(self, painter, area, level, bins):    # Карта плотности: метка на ячейку уровня level, яркость - по числу штампов.
+        size = self.stamp_index.cell_size << level
+        left, top = area.left() // size, area.top() // size
+        cols = area.right() // size - left + 1
+        rows = area.bottom() // size - top + 1
+
+        # Метки пишутся прямо в буфер ARGB32 (синий с прозрачностью) и выводятся одним вызовом drawImage
+        pixels = bytearray(cols * rows * 4)
+        for (cx, cy), count in bins:
+            alpha = min(255, 60 + 25 * count.bit_length())    # Яркость растет логарифмически.
+            offset = 4 * ((cy - top) * cols + (cx - left))
+            pixels[offset] = alpha
+            pixels[offset + 3] = alpha
+        image = QImage(pixels, cols, rows, cols * 4, QImage.Format.Format_ARGB32_Premultiplied)
+
+        bin_px = size * self.view_scale
+        target = QRectF(left * bin_px + self.view_offset.x(), top * bin_px + self.view_offset.y(),
+                        cols * bin_px, rows * bin_px)
+        painter.drawImage(target, image)
+
     def paintEvent(self, event):    # Обработчик события перерисовки виджета.
         painter = QPainter(self)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)   # Включение сглаживания
 
-        for pos in self.click_positions:
-            # Размеры фигур
-            outer_size = 150  # Сторона внешнего квадрата
-            circle_diameter = outer_size  # Диаметр окружности равен стороне квадрата
-            
-            # Диагональ внутреннего квадрата равна диаметру окружности
-            # Для квадрата: диагональ = сторона * √2 ≈ сторона * 1.414
-            inner_size = int(circle_diameter / 1.414)  # Сторона внутреннего квадрата
-            
-            # Рисуем внешний синий квадрат
-            painter.setPen(QPen(QColor(0, 0, 255), 2))
-            painter.setBrush(QBrush(QColor(0, 0, 255)))
-            painter.drawRect(
-                int(pos.x() - outer_size/2), 
-                int(pos.y() - outer_size/2), 
-                outer_size, 
-                outer_size
-            )
-            
-            # Рисуем белую окружность (диаметр = стороне внешнего квадрата)
-            painter.setPen(QPen(QColor(255, 255, 255), 2))
-            painter.setBrush(QBrush(QColor(255, 255, 255)))
-            painter.drawEllipse(
-                int(pos.x() - circle_diameter/2), 
-                int(pos.y() - circle_diameter/2), 
-                circle_diameter, 
-                circle_diameter
-            )
-            
-            # Рисуем внутренний синий квадрат (диагональ = диаметру окружности)
-            painter.setPen(QPen(QColor(0, 0, 255), 2))
-            painter.setBrush(QBrush(QColor(0, 0, 255)))
-            painter.drawRect(
-                int(pos.x() - inner_size/2), 
-                int(pos.y() - inner_size/2), 
-                inner_size, 
-                inner_size
-            )
+        if not self.view_is_identity():
+            self.paint_view(painter, event.rect())
+            return
+
+        if self.paint_mode == "layered":
+            # Копируем из буфера только ту область, которую нужно перерисовать
+            self.sync_backing()
+            dpr = self._backing.devicePixelRatio()
+            target = QRectF(event.rect())
+            source = QRectF(target.x() * dpr, target.y() * dpr, target.width() * dpr, target.height() * dpr)
+            painter.drawImage(target, self._backing, source)
+            return
+
+        if self.paint_mode == "tiled":
+            # Выводим готовые плитки, на месте остальных - заглушка, пока их рисуют фоновые потоки
+            self.sync_tiles()
+            placeholder = QBrush(QColor(200, 200, 200), Qt.BrushStyle.Dense6Pattern)
+            for tile in self.tiles_in_rect(event.rect()):
+                image = self._tiles.get(tile)
+                if image is None:
+                    if tile not in self._pending_tiles:
+                        self.submit_tile(tile)
+                    if tile in self._pending_tiles:
+                        painter.fillRect(self.tile_rect(tile), placeholder)
+                        continue
+                    image = self._tiles[tile]
+                if not image.isNull():
+                    painter.drawImage(QPoint(tile[0] * TILE_SIZE, tile[1] * TILE_SIZE), image)
+            return
+
+        # Рисуем только штампы, которые пересекают перерисовываемую область
+        clicks = self.click_positions
+        self.draw_stamps(painter, (clicks[index] for index in self.stamps_in_rect(event.rect())))
 
 
 class MainWindow(QMainWindow):
@@ -67,13 +795,75 @@ class MainWindow(QMainWindow):
         self.drawing_widget = DrawingWidget()
         self.setCentralWidget(self.drawing_widget)
 
+        file_menu = self.menuBar().addMenu("Файл")
+        file_menu.addAction("Открыть сессию...", QKeySequence.StandardKey.Open, self.open_session)
+        file_menu.addAction("Сохранить сессию...", QKeySequence.StandardKey.Save, self.save_session)
+        file_menu.addAction("Импорт кликов...", QKeySequence("Ctrl+I"), self.import_clicks)
+
+        view_menu = self.menuBar().addMenu("Вид")
+        view_menu.addAction("Масштаб 1:1", QKeySequence("Ctrl+0"), self.drawing_widget.reset_view)
+        view_menu.addSeparator()
+        mode_group = QActionGroup(self)
+        paint_group = QActionGroup(self)
+        for title, mode in (("Буфер готовых штампов", "layered"),
+                            ("Фоновая растеризация плитками", "tiled"),
+                            ("Без буфера", "direct")):
+            action = view_menu.addAction(title)
+            action.setCheckable(True)
+            action.setChecked(mode == self.drawing_widget.paint_mode)
+            action.triggered.connect(lambda checked, mode=mode: self.drawing_widget.set_paint_mode(mode))
+            paint_group.addAction(action)
+
+        view_menu.addSeparator()
+        for title, mode in (("Штампы из готового изображения", "pixmap"),
+                            ("Штампы пачками по цветам", "batched"),
+                            ("Штампы по одному (векторно)", "vector")):
+            action = view_menu.addAction(title)
+            action.setCheckable(True)
+            action.setChecked(mode == self.drawing_widget.stamp_mode)
+            action.triggered.connect(lambda checked, mode=mode: self.drawing_widget.set_stamp_mode(mode))
+            mode_group.addAction(action)
+
+    def open_session(self):    # Выбор и загрузка файла сессии.
+        filename, _ = QFileDialog.getOpenFileName(self, "Открыть сессию", "", SESSION_FILTER)
+        if filename:
+            try:
+                self.drawing_widget.load_session(filename)
+            except (OSError, ValueError) as e:
+                QMessageBox.warning(self, "Ошибка", f"Не удалось открыть сессию: {e}")
+
+    def import_clicks(self):    # Выбор файла и потоковый импорт кликов поверх текущих.
+        filename, _ = QFileDialog.getOpenFileName(self, "Импорт кликов", "", IMPORT_FILTER)
+        if filename:
+            self.drawing_widget.import_clicks(filename)
+
+    def save_session(self):    # Выбор файла и сохранение сессии.
+        filename, _ = QFileDialog.getSaveFileName(self, "Сохранить сессию", "", SESSION_FILTER)
+        if filename:
+            try:
+                self.drawing_widget.save_session(filename)
+            except OSError as e:
+                QMessageBox.warning(self, "Ошибка", f"Не удалось сохранить сессию: {e}")
+
 
 def main():
+    parser = argparse.ArgumentParser(description="Рисование фигур")
+    parser.add_argument("--import", dest="import_files", action="append", default=[], metavar="FILE",
+                        help="импортировать клики из файла (CSV, файл сессии или сырые пары int32)")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE,
+                        help="сколько кликов читать и добавлять за раз")
+    args, qt_args = parser.parse_known_args()
+    if args.chunk_size <= 0:
+        parser.error("--chunk-size должен быть положительным")
+
     try:
-        app = QApplication(sys.argv)
+        app = QApplication(sys.argv[:1] + qt_args)
         window = MainWindow()
         window.show()
+        for filename in args.import_files:
+            window.drawing_widget.import_clicks(filename, args.chunk_size)
         print("Приложение запущено успешно! Кликайте левой кнопкой мыши для рисования.")
+        print("Колесо мыши - масштаб, перетаскивание правой или средней кнопкой - сдвиг холста.")
         return app.exec()
     except Exception as e:
         print(f"Произошла ошибка: {e}")
@@ -81,4 +871,4 @@ def main():
 
 
 if __name__ == "__main__":
-    sys.exit(main())
\ No newline at end of file
+    sys.exit(main())
@@ -1,6 +1,12 @@
 import pygame
 import math
 import sys
+import gc
+import time
+import struct
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
 
 pygame.init()
 
@@ -8,13 +14,208 @@ WIDTH, HEIGHT = 1000, 700
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 BLUE = (50, 150, 255)
+BAND_COLOR = (120, 120, 120)
+
+ARROW_OUTLINE = [0, 5, 4, 3, 2, 6, 1]
+GRID_CELL_SIZE = 128
+DIRTY_MARGIN = 4
+MAX_DIRTY_RECTS = 32
+FPS = 60
+IDLE_TIMEOUT_MS = 500
+SPRITE_CACHE_SIZE = 256
+SPRITE_CACHE_BYTES = 64 * 1024 * 1024
+MAX_SPRITE_SIZE = 256
+SPRITE_ANGLE_STEP = 5
+SPRITE_SUPERSAMPLE = 4
+SPRITE_PADDING = 2
+TEXT_CACHE_SIZE = 128
+MENU_LINE_HEIGHT = 25
+ZOOM_STEP = 1.25
+MIN_ZOOM_LEVEL = -12
+MAX_ZOOM_LEVEL = 12
+
+SCENE_FILE = "scene.kgs"
+SCENE_MAGIC = b"KGSCENE1"
+SCENE_HEADER = struct.Struct("<8sQQQ")
+SCENE_ALIGN = 8
+POLYGON_KIND, ARROW_KIND, EDITED_ARROW_KIND = 0, 1, 2
+
+
+def affine_matrix(angle_degrees: float, dx: float, dy: float, pivot_x: float, pivot_y: float):
+    angle_rad = math.radians(angle_degrees)
+    cos_a = math.cos(angle_rad)
+    sin_a = math.sin(angle_rad)
+
+    # Сдвиг на (dx, dy), затем поворот вокруг сдвинутой опорной точки
+    return np.array([
+        [cos_a, -sin_a, pivot_x + dx - (cos_a * pivot_x - sin_a * pivot_y)],
+        [sin_a, cos_a, pivot_y + dy - (sin_a * pivot_x + cos_a * pivot_y)],
+    ])
+
+
+class PointPool:
+    # Строка вершины - 32 байта (coords, world во float64), у стрелки 7 строк; сдвиг и угол -
+    # еще 24 байта на фигуру. Вместе с объектом Arrow, кэшем рамки и запасом емкости при удвоении
+    # выходит ~700-850 байт на стрелку против ~1300 до пула: дальше упирается в float64-координаты
+    # и в то, что фигура остается объектом Python
+    def __init__(self, capacity: int = 1024):
+        self.coords = np.zeros((capacity, 2))
+        self.world = np.zeros((capacity, 2))
+        self.size = 0
+        # Сдвиг и угол - по слоту фигуры, отдельно от строк вершин
+        self.shift = np.zeros((capacity, 2))
+        self.angles = np.zeros(capacity)
+        self.slot_count = 0
+        self.labels = {}
+        self._free = {}
+        self._free_slots = []
+
+    def allocate(self, coords) -> int:
+        count = len(coords)
+        free = self._free.get(count)
+        if free:
+            offset = free.pop()
+        else:
+            offset = self.size
+            if offset + count > len(self.coords):
+                self._grow(("coords", "world"), self.size, offset + count)
+            self.size += count
+        self.coords[offset:offset + count] = coords
+        return offset
+
+    def allocate_slots(self, count: int = 1) -> int:
+        # Одиночный слот берется из освободившихся, пачка (загрузка сцены) - подряд в конце
+        if count == 1 and self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            slot = self.slot_count
+            if slot + count > len(self.angles):
+                self._grow(("shift", "angles"), self.slot_count, slot + count)
+            self.slot_count += count
+        self.shift[slot:slot + count] = 0.0
+        self.angles[slot:slot + count] = 0.0
+        return slot
+
+    def release(self, offset: int, count: int, slot: int):
+        if self.labels:
+            for index in range(offset, offset + count):
+                self.labels.pop(index, None)
+        self._free.setdefault(count, []).append(offset)
+        self._free_slots.append(slot)
+
+    def _grow(self, names, used: int, required: int):
+        capacity = max(required, 2 * len(getattr(self, names[0])))
+        for name in names:
+            old = getattr(self, name)
+            array = np.zeros((capacity,) + old.shape[1:])
+            array[:used] = old[:used]
+            setattr(self, name, array)
+
+
+POINT_POOL = PointPool()
+
+
+def surface_bytes(surface) -> int:
+    return surface.get_pitch() * surface.get_height()
+
+
+class SpriteCache:
+    def __init__(self, capacity: int = SPRITE_CACHE_SIZE, max_bytes: int = None, measure=surface_bytes):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.measure = measure
+        self.bytes = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, build):
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = build()
+            self._entries[key] = entry
+            if self.max_bytes is not None:
+                self.bytes += self.measure(entry)
+            self._evict()
+        else:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _evict(self):
+        # Старые записи вытесняются сверх лимита по числу и по объему; последняя остается
+        while len(self._entries) > 1 and (len(self._entries) > self.capacity or
+                                          (self.max_bytes is not None and self.bytes > self.max_bytes)):
+            _, entry = self._entries.popitem(last=False)
+            if self.max_bytes is not None:
+                self.bytes -= self.measure(entry)
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+ARROW_SPRITES = SpriteCache(SPRITE_CACHE_SIZE, SPRITE_CACHE_BYTES, lambda entry: surface_bytes(entry[0]))
 
 
 class CBasePoint:
+    __slots__ = ("_owner", "_coords", "_index", "_label")
+
     def __init__(self, x: float, y: float):
-        self.x = x
-        self.y = y
-        self.label = ""
+        self._owner = None
+        self._coords = np.array([[x, y]], dtype=float)
+        self._index = 0
+        self._label = ""
+
+    @classmethod
+    def view(cls, owner, index: int):
+        point = cls.__new__(cls)
+        point._owner = owner
+        point._coords = None
+        point._index = index
+        return point
+
+    @property
+    def label(self) -> str:
+        if self._owner is None:
+            return self._label
+        return self._owner.pool.labels.get(self._owner.offset + self._index, "")
+
+    @label.setter
+    def label(self, value: str):
+        if self._owner is None:
+            self._label = value
+        elif value:
+            self._owner.pool.labels[self._owner.offset + self._index] = value
+        else:
+            self._owner.pool.labels.pop(self._owner.offset + self._index, None)
+
+    def _get(self, axis: int) -> float:
+        coords = self._coords if self._owner is None else self._owner.vertices
+        return float(coords[self._index, axis])
+
+    def _set(self, axis: int, value: float):
+        if self._owner is None:
+            self._coords[self._index, axis] = value
+        else:
+            x, y = self._owner.vertices[self._index]
+            self._owner.set_vertex(self._index, value if axis == 0 else x, value if axis == 1 else y)
+
+    @property
+    def x(self) -> float:
+        return self._get(0)
+
+    @x.setter
+    def x(self, value: float):
+        self._set(0, value)
+
+    @property
+    def y(self) -> float:
+        return self._get(1)
+
+    @y.setter
+    def y(self, value: float):
+        self._set(1, value)
 
     def transform(self, dx: float, dy: float, angle_degrees: float = 0, pivot_x: float = None, pivot_y: float = None):
         self.x += dx
@@ -41,54 +242,100 @@ class CBasePoint:
 
 
 class Polygon:
-    def __init__(self, points):
-        self.points = [CBasePoint(x, y) for x, y, _ in points]
+    __slots__ = ("pool", "offset", "count", "slot", "_world_valid", "_bounds", "color", "selected", "rotation_angle")
+
+    def __init__(self, points, pool: PointPool = None):
+        self.pool = pool if pool is not None else POINT_POOL
+        self.count = len(points)
+        self.offset = self.pool.allocate(np.array([(x, y) for x, y, _ in points], dtype=float).reshape(-1, 2))
         for i, (_, _, label) in enumerate(points):
             if label:
-                self.points[i].label = label
+                self.pool.labels[self.offset + i] = label
+        self._attach(self.pool, self.offset, self.count, self.pool.allocate_slots())
+
+    @classmethod
+    def from_pool(cls, pool: PointPool, offset: int, count: int, slot: int):
+        # Фигура поверх уже заполненных строк пула, без разбора точек
+        polygon = cls.__new__(cls)
+        polygon._attach(pool, offset, count, slot)
+        return polygon
+
+    def _attach(self, pool: PointPool, offset: int, count: int, slot: int):
+        self.pool = pool
+        self.offset = offset
+        self.count = count
+        self.slot = slot
+        self._world_valid = False
+        self._bounds = None
         self.color = BLUE
         self.selected = False
         self.rotation_angle = 0
 
-    def draw(self, surface):
-        if len(self.points) >= 7:
-            point_list = [
-                (self.points[0].x, self.points[0].y),
-                (self.points[5].x, self.points[5].y),
-                (self.points[4].x, self.points[4].y),
-                (self.points[3].x, self.points[3].y),
-                (self.points[2].x, self.points[2].y),
-                (self.points[6].x, self.points[6].y),
-                (self.points[1].x, self.points[1].y)
-            ]
-            
-            pygame.draw.polygon(surface, self.color, point_list, 0)
-            
-            line_color = (255, 0, 0) if self.selected else BLACK
-            pygame.draw.polygon(surface, line_color, point_list, 2)
-            
-            pygame.draw.line(surface, BLACK, 
-                           (self.points[0].x, self.points[0].y),
-                           (self.points[5].x, self.points[5].y), 2)
-            pygame.draw.line(surface, BLACK, 
-                           (self.points[5].x, self.points[5].y),
-                           (self.points[4].x, self.points[4].y), 2)
-            
-            pygame.draw.line(surface, BLACK, 
-                           (self.points[1].x, self.points[1].y),
-                           (self.points[6].x, self.points[6].y), 2)
-            pygame.draw.line(surface, BLACK, 
-                           (self.points[6].x, self.points[6].y),
-                           (self.points[2].x, self.points[2].y), 2)
+    @property
+    def base_vertices(self):
+        return self.pool.coords[self.offset:self.offset + self.count]
+
+    @property
+    def angle(self) -> float:
+        return float(self.pool.angles[self.slot])
+
+    @property
+    def points(self):
+        return [CBasePoint.view(self, i) for i in range(self.count)]
+
+    @property
+    def vertices(self):
+        world = self.pool.world[self.offset:self.offset + self.count]
+        if not self._world_valid:
+            if self.count:
+                base = self.base_vertices
+                dx, dy = self.pool.shift[self.slot].tolist()
+                matrix = affine_matrix(self.angle, dx, dy, base[0, 0], base[0, 1])
+                np.matmul(base, matrix[:, :2].T, out=world)
+                world += matrix[:, 2]
+            self._world_valid = True
+        return world
+
+    def set_vertex(self, index: int, x: float, y: float):
+        base = self.base_vertices
+        base[:] = self.vertices
+        base[index] = (x, y)
+        self.pool.shift[self.slot] = 0.0
+        self.pool.angles[self.slot] = 0.0
+        self._world_valid = False
+        self._bounds = None
+
+    def release(self):
+        self.pool.release(self.offset, self.count, self.slot)
+        self.count = 0
+
+    def draw(self, surface, camera=None):
+        if self.count >= 7:
+            vertices = self.vertices if camera is None else camera.to_screen(self.vertices)
+            self.draw_vertices(surface, vertices.tolist(), 2)
+
+    def draw_vertices(self, surface, vertices, width: int):
+        point_list = [vertices[i] for i in ARROW_OUTLINE]
+        
+        pygame.draw.polygon(surface, self.color, point_list, 0)
+        
+        line_color = (255, 0, 0) if self.selected else BLACK
+        pygame.draw.polygon(surface, line_color, point_list, width)
+        
+        pygame.draw.line(surface, BLACK, vertices[0], vertices[5], width)
+        pygame.draw.line(surface, BLACK, vertices[5], vertices[4], width)
+        
+        pygame.draw.line(surface, BLACK, vertices[1], vertices[6], width)
+        pygame.draw.line(surface, BLACK, vertices[6], vertices[2], width)
 
     def transform_position(self, angle_degrees: float = 0, dx: float = 0, dy: float = 0):
-        if not self.points:
+        if not self.count:
             return
 
-        pivot = self.points[0]
-
-        for point in self.points:
-            point.transform(dx, dy, angle_degrees, pivot.x, pivot.y)
+        self.pool.shift[self.slot] += (dx, dy)
+        self.pool.angles[self.slot] = (self.angle + angle_degrees) % 360
+        self._world_valid = False
+        self._bounds = None
         
         self.rotation_angle += angle_degrees
         self.rotation_angle %= 360
@@ -99,29 +346,106 @@ class Polygon:
     def rotate(self, angle_degrees: float):
         self.transform_position(angle_degrees, 0, 0)
 
+    def bounds(self):
+        if self._bounds is None:
+            if self.count:
+                vertices = self.vertices
+                self._bounds = tuple(vertices.min(axis=0).tolist() + vertices.max(axis=0).tolist())
+            else:
+                self._bounds = (0.0, 0.0, 0.0, 0.0)
+        return self._bounds
+
     def get_bounding_rect(self):
-        if not self.points:
+        if not self.count:
             return pygame.Rect(0, 0, 0, 0)
 
-        min_x = min(point.x for point in self.points)
-        min_y = min(point.y for point in self.points)
-        max_x = max(point.x for point in self.points)
-        max_y = max(point.y for point in self.points)
+        min_x, min_y, max_x, max_y = self.bounds()
 
         return pygame.Rect(min_x, min_y, max_x - min_x, max_y - min_y)
 
+    def outline(self):
+        if self.count >= 7:
+            return self.vertices[ARROW_OUTLINE]
+        return self.vertices
+
+    def contains_point(self, x: float, y: float) -> bool:
+        min_x, min_y, max_x, max_y = self.bounds()
+        if not (self.count >= 3 and min_x <= x <= max_x and min_y <= y <= max_y):
+            return False
+
+        outline = self.outline()
+        xs, ys = outline[:, 0], outline[:, 1]
+        next_xs, next_ys = np.roll(xs, -1), np.roll(ys, -1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            crossings = ((ys > y) != (next_ys > y)) & (x < (next_xs - xs) * (y - ys) / (next_ys - ys) + xs)
+        return bool(np.count_nonzero(crossings) % 2)
+
 
 class Arrow(Polygon):
-    def __init__(self, center_x: float, center_y: float, size: float = 100):
+    __slots__ = ("direction", "center_x", "center_y", "size", "_canonical")
+
+    def __init__(self, center_x: float, center_y: float, size: float = 100, pool: PointPool = None):
         self.direction = 270
         
         points = self.calculate_points(center_x, center_y, size)
         
-        super().__init__(points)
+        super().__init__(points, pool)
         self.center_x = center_x
         self.center_y = center_y
         self.size = size
         self.rotation_angle = 270
+        self._canonical = True
+
+    def set_vertex(self, index: int, x: float, y: float):
+        super().set_vertex(index, x, y)
+        # Форма изменена вручную - готовые спрайты к ней уже не подходят
+        self._canonical = False
+
+    def sprite_angle(self):
+        step = round(self.angle / SPRITE_ANGLE_STEP)
+        if abs(self.angle - step * SPRITE_ANGLE_STEP) > 1e-6:
+            return None
+        return step * SPRITE_ANGLE_STEP % 360
+
+    def draw(self, surface, camera=None):
+        angle = self.sprite_angle() if self._canonical and self.count >= 7 else None
+        if angle is None:
+            super().draw(surface, camera)
+            return
+
+        zoom = 1.0 if camera is None else camera.zoom
+        min_x, min_y, max_x, max_y = self.bounds()
+        if max(max_x - min_x, max_y - min_y) * zoom > MAX_SPRITE_SIZE:
+            # Крупная стрелка дешевле векторно, чем через огромный спрайт
+            super().draw(surface, camera)
+            return
+
+        key = (self.size, zoom, angle, self.selected, self.color)
+        sprite, anchor_x, anchor_y = ARROW_SPRITES.get(key, lambda: self.render_sprite(angle, zoom))
+        anchor = self.vertices[:1] if camera is None else camera.to_screen(self.vertices[:1])
+        x, y = anchor[0].tolist()
+        surface.blit(sprite, (round(x - anchor_x), round(y - anchor_y)))
+
+    def render_sprite(self, angle: float, zoom: float = 1.0):
+        # Стрелка рисуется с запасом по разрешению и сглаживается уменьшением;
+        # якорь - положение нулевой вершины внутри спрайта
+        base = self.base_vertices
+        matrix = affine_matrix(angle, 0, 0, base[0, 0], base[0, 1])
+        relative = (base - base[0]) @ matrix[:, :2].T * zoom
+        origin = relative.min(axis=0) - SPRITE_PADDING
+        width, height = np.ceil(relative.max(axis=0) + SPRITE_PADDING - origin).astype(int).tolist()
+
+        # Сдвиг на полпикселя повторяет растеризацию pygame, где вершина
+        # попадает в центр пикселя floor(x)
+        scale = SPRITE_SUPERSAMPLE
+        canvas = pygame.Surface((width * scale, height * scale), pygame.SRCALPHA)
+        self.draw_vertices(canvas, ((relative - origin) * scale + (scale - 1) / 2).tolist(), 2 * scale)
+        sprite = pygame.transform.smoothscale(canvas, (width, height))
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert_alpha()
+        # RLE пропускает прозрачные участки спрайта при наложении
+        sprite.set_alpha(255, pygame.RLEACCEL)
+        return sprite, -origin[0], -origin[1]
 
     def calculate_points(self, center_x: float, center_y: float, size: float):
         arrow_length = size * 2.0
@@ -174,14 +498,549 @@ class Arrow(Polygon):
         return rotated_points
 
 
-class Painter:
+def world_bounds(pool: PointPool, offsets, counts, slots):
+    # Мировые координаты пересчитываются сразу для всех фигур с одинаковым
+    # числом вершин одной операцией над массивом (n, count, 2)
+    bounds = np.zeros((len(offsets), 4))
+    for count in np.unique(counts).tolist():
+        if not count:
+            continue
+        mask = counts == count
+        group_offsets = offsets[mask]
+        group_slots = slots[mask]
+        rows = group_offsets[:, None] + np.arange(count)
+
+        base = pool.coords[rows]
+        anchors = base[:, :1]
+        relative = base - anchors
+        angles = np.radians(pool.angles[group_slots])[:, None]
+        cos_a, sin_a = np.cos(angles), np.sin(angles)
+
+        world = np.empty_like(base)
+        world[..., 0] = cos_a * relative[..., 0] - sin_a * relative[..., 1]
+        world[..., 1] = sin_a * relative[..., 0] + cos_a * relative[..., 1]
+        world += anchors + pool.shift[group_slots][:, None]
+        pool.world[rows] = world
+
+        # Поэлементный min/max по вершинам быстрее редукции по средней оси
+        lows = world[:, 0].copy()
+        highs = lows.copy()
+        for k in range(1, count):
+            np.minimum(lows, world[:, k], out=lows)
+            np.maximum(highs, world[:, k], out=highs)
+        bounds[mask, :2] = lows
+        bounds[mask, 2:] = highs
+    return bounds
+
+
+def refresh_vertices(pool: PointPool, polygons, offsets, slots):
+    counts = np.fromiter((polygon.count for polygon in polygons), dtype=np.intp, count=len(polygons))
+    for polygon, bound in zip(polygons, world_bounds(pool, offsets, counts, slots).tolist()):
+        polygon._world_valid = True
+        polygon._bounds = tuple(bound)
+
+
+def transform_group(polygons, angle_degrees: float = 0, dx: float = 0, dy: float = 0, pivot=None):
+    # Без pivot каждая фигура поворачивается вокруг своей нулевой вершины,
+    # как в Polygon.transform_position; иначе - вся группа вокруг общей точки
+    by_pool = {}
+    for polygon in polygons:
+        if polygon.count:
+            by_pool.setdefault(polygon.pool, []).append(polygon)
+
+    for pool, group in by_pool.items():
+        offsets = np.fromiter((polygon.offset for polygon in group), dtype=np.intp, count=len(group))
+        slots = np.fromiter((polygon.slot for polygon in group), dtype=np.intp, count=len(group))
+        shift = pool.shift[slots] + (dx, dy)
+        if pivot is not None and angle_degrees:
+            matrix = affine_matrix(angle_degrees, 0, 0, pivot[0], pivot[1])
+            anchors = pool.coords[offsets]
+            shift = (anchors + shift) @ matrix[:, :2].T + matrix[:, 2] - anchors
+        pool.shift[slots] = shift
+        pool.angles[slots] = (pool.angles[slots] + angle_degrees) % 360
+        refresh_vertices(pool, group, offsets, slots)
+
+        for polygon in group:
+            polygon.rotation_angle = (polygon.rotation_angle + angle_degrees) % 360
+
+
+@contextmanager
+def gc_paused():
+    # Сборщик мусора отключается на время создания сотен тысяч объектов:
+    # иначе его проходы по растущему поколению занимают половину загрузки
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def scene_columns(polygon_count: int, vertex_count: int, label_count: int):
+    return [
+        ("offsets", np.dtype("<i8"), (polygon_count + 1,)),
+        ("coords", np.dtype("<f8"), (vertex_count, 2)),
+        ("shift", np.dtype("<f8"), (polygon_count, 2)),
+        ("angles", np.dtype("<f8"), (polygon_count,)),
+        ("rotation", np.dtype("<f8"), (polygon_count,)),
+        ("colors", np.dtype("u1"), (polygon_count, 3)),
+        ("kinds", np.dtype("u1"), (polygon_count,)),
+        ("arrows", np.dtype("<f8"), (polygon_count, 3)),
+        ("label_index", np.dtype("<i8"), (label_count,)),
+        ("label_size", np.dtype("<i4"), (label_count,)),
+    ]
+
+
+def save_scene(filename: str, polygons):
+    # Колоночный формат: заголовок, затем массивы подряд с выравниванием
+    # по 8 байт и в конце подписи вершин в UTF-8
+    polygons = list(polygons)
+    counts = np.fromiter((polygon.count for polygon in polygons), dtype=np.int64, count=len(polygons))
+    offsets = np.zeros(len(polygons) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    label_index, labels = [], []
+    for i, polygon in enumerate(polygons):
+        pool_labels = polygon.pool.labels
+        if not pool_labels:
+            continue
+        for j in range(polygon.count):
+            label = pool_labels.get(polygon.offset + j)
+            if label:
+                label_index.append(int(offsets[i]) + j)
+                labels.append(label.encode("utf-8"))
+
+    arrows = np.zeros((len(polygons), 3))
+    kinds = np.zeros(len(polygons), dtype=np.uint8)
+    for i, polygon in enumerate(polygons):
+        if isinstance(polygon, Arrow):
+            arrows[i] = (polygon.center_x, polygon.center_y, polygon.size)
+            kinds[i] = ARROW_KIND if polygon._canonical else EDITED_ARROW_KIND
+
+    columns = {
+        "offsets": offsets,
+        "coords": np.concatenate([polygon.base_vertices for polygon in polygons]) if polygons else np.zeros((0, 2)),
+        "shift": np.array([polygon.pool.shift[polygon.slot] for polygon in polygons]).reshape(-1, 2),
+        "angles": np.array([polygon.angle for polygon in polygons]),
+        "rotation": np.array([polygon.rotation_angle for polygon in polygons], dtype=float),
+        "colors": np.array([polygon.color[:3] for polygon in polygons], dtype=np.uint8).reshape(-1, 3),
+        "kinds": kinds,
+        "arrows": arrows,
+        "label_index": np.array(label_index, dtype=np.int64),
+        "label_size": np.array([len(label) for label in labels], dtype=np.int32),
+    }
+
+    with open(filename, "wb") as file:
+        file.write(SCENE_HEADER.pack(SCENE_MAGIC, len(polygons), int(offsets[-1]), len(labels)))
+        for name, dtype, shape in scene_columns(len(polygons), int(offsets[-1]), len(labels)):
+            file.write(b"\0" * (-file.tell() % SCENE_ALIGN))
+            file.write(np.ascontiguousarray(columns[name], dtype=dtype).reshape(shape).tobytes())
+        file.write(b"".join(labels))
+
+
+def load_scene(filename: str, pool: PointPool = None):
+    pool = pool if pool is not None else POINT_POOL
+    raw = np.memmap(filename, dtype=np.uint8, mode="r")
+    if len(raw) < SCENE_HEADER.size:
+        raise ValueError(f"{filename}: файл слишком короткий")
+    magic, polygon_count, vertex_count, label_count = SCENE_HEADER.unpack(raw[:SCENE_HEADER.size].tobytes())
+    if magic != SCENE_MAGIC:
+        raise ValueError(f"{filename}: не файл сцены")
+
+    columns = {}
+    position = SCENE_HEADER.size
+    for name, dtype, shape in scene_columns(polygon_count, vertex_count, label_count):
+        position += -position % SCENE_ALIGN
+        size = dtype.itemsize * int(np.prod(shape))
+        if position + size > len(raw):
+            raise ValueError(f"{filename}: файл обрезан")
+        columns[name] = np.frombuffer(raw, dtype=dtype, count=size // dtype.itemsize, offset=position).reshape(shape)
+        position += size
+
+    offsets = columns["offsets"]
+    if offsets[0] != 0 or offsets[-1] != vertex_count or np.any(np.diff(offsets) < 0):
+        raise ValueError(f"{filename}: неверная таблица смещений")
+
+    # Все вершины копируются в пул одним блоком, сдвиги и углы - в подряд идущие слоты фигур
+    base = pool.allocate(columns["coords"]) if vertex_count else pool.size
+    starts = (base + offsets[:-1]).astype(np.intp)
+    slots = np.arange(polygon_count, dtype=np.intp) + pool.allocate_slots(polygon_count)
+    pool.shift[slots] = columns["shift"]
+    pool.angles[slots] = columns["angles"]
+
+    blob = raw[position:].tobytes()
+    label_ends = np.cumsum(columns["label_size"]).tolist()
+    for index, start, end in zip(columns["label_index"].tolist(), [0] + label_ends, label_ends):
+        pool.labels[base + index] = blob[start:end].decode("utf-8")
+
+    counts = np.diff(offsets)
+    bounds = world_bounds(pool, starts, counts, slots)
+
+    with gc_paused():
+        return build_polygons(pool, starts.tolist(), counts.tolist(), slots.tolist(), bounds.tolist(), columns)
+
+
+def build_polygons(pool: PointPool, starts, counts, slots, bounds, columns):
+    polygons = []
+    for start, count, slot, bound, color, rotation, kind, arrow in zip(starts, counts, slots, bounds,
+                                                                       columns["colors"].tolist(),
+                                                                       columns["rotation"].tolist(),
+                                                                       columns["kinds"].tolist(),
+                                                                       columns["arrows"].tolist()):
+        if kind == POLYGON_KIND:
+            polygon = Polygon.from_pool(pool, start, count, slot)
+        else:
+            polygon = Arrow.from_pool(pool, start, count, slot)
+            polygon.direction = 270
+            polygon.center_x, polygon.center_y, polygon.size = arrow
+            polygon._canonical = kind == ARROW_KIND
+        polygon.color = tuple(color)
+        polygon.rotation_angle = rotation
+        polygon._world_valid = True
+        polygon._bounds = tuple(bound)
+        polygons.append(polygon)
+    return polygons
+
+
+class SpatialGrid:
+    def __init__(self, cell_size: int = GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        # Ячейки хранят слоты фигур; рамка и порядок фигуры лежат в массивах по ее слоту
+        self.cells = {}
+        self._cells_of = {}
+        self._slots = {}
+        self._polygons = []
+        self._free_slots = []
+        self._bounds = np.zeros((0, 4))
+        self._ranks = np.zeros(0, dtype=np.int64)
+        self._dirty = set()
+        # Для выбора мышью: ячейка -> ее слоты сверху вниз и их рамки, строится при первом клике в ячейку
+        self._picks = {}
+
+    def insert(self, polygon, order: int):
+        if polygon not in self._slots:
+            self._assign_slots([polygon])
+        self._ranks[self._slots[polygon]] = order
+        self._dirty.add(polygon)
+
+    def insert_many(self, polygons, orders):
+        # Массовая вставка новых фигур (загрузка сцены): диапазоны ячеек
+        # считаются сразу для всех, фигуры раскладываются по ячейкам пачками
+        polygons = list(polygons)
+        if not polygons:
+            return
+        with gc_paused():
+            self._insert_many(polygons, orders)
+
+    def _insert_many(self, polygons, orders):
+        bounds = np.array([polygon.bounds() for polygon in polygons]).reshape(-1, 4)
+        slots = self._assign_slots(polygons)
+        self._bounds[slots] = bounds
+        self._ranks[slots] = list(orders)
+        ranges = np.floor_divide(bounds, self.cell_size).astype(np.int64)
+        spans_y = ranges[:, 3] - ranges[:, 1] + 1
+        sizes = (ranges[:, 2] - ranges[:, 0] + 1) * spans_y
+
+        owners = np.repeat(np.arange(len(polygons)), sizes)
+        local = np.arange(len(owners)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        cxs = ranges[owners, 0] + local // spans_y[owners]
+        cys = ranges[owners, 1] + local % spans_y[owners]
+
+        keys = (cxs - cxs.min()) * (int(cys.max() - cys.min()) + 1) + (cys - cys.min())
+        order = np.argsort(keys, kind="stable")
+        keys, cxs, cys, owners = keys[order], cxs[order], cys[order], owners[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], len(owners)]
+
+        owner_slots = slots[owners]
+        for cx, cy, start, end in zip(cxs[starts].tolist(), cys[starts].tolist(), starts.tolist(), ends.tolist()):
+            self.cells.setdefault((cx, cy), set()).update(owner_slots[start:end].tolist())
+
+        self._cells_of.update(zip(polygons, map(tuple, ranges.tolist())))
+        self._picks.clear()
+
+    def _assign_slots(self, polygons):
+        slots = []
+        for polygon in polygons:
+            if self._free_slots:
+                slot = self._free_slots.pop()
+                self._polygons[slot] = polygon
+            else:
+                slot = len(self._polygons)
+                self._polygons.append(polygon)
+            self._slots[polygon] = slot
+            slots.append(slot)
+
+        if len(self._polygons) > len(self._ranks):
+            capacity = max(len(self._polygons), 2 * len(self._ranks), 1024)
+            bounds = np.zeros((capacity, 4))
+            bounds[:len(self._bounds)] = self._bounds
+            ranks = np.zeros(capacity, dtype=np.int64)
+            ranks[:len(self._ranks)] = self._ranks
+            self._bounds, self._ranks = bounds, ranks
+        return np.array(slots, dtype=np.int64)
+
+    def update(self, polygon):
+        if polygon in self._slots:
+            self._dirty.add(polygon)
+
+    def remove(self, polygon):
+        self._unlink(polygon)
+        self._dirty.discard(polygon)
+        slot = self._slots.pop(polygon, None)
+        if slot is not None:
+            self._polygons[slot] = None
+            self._free_slots.append(slot)
+
+    def _unlink(self, polygon):
+        cell_range = self._cells_of.pop(polygon, None)
+        if cell_range is None:
+            return
+
+        slot = self._slots[polygon]
+        left, top, right, bottom = cell_range
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                self._picks.pop((cx, cy), None)
+                bucket = self.cells[(cx, cy)]
+                bucket.discard(slot)
+                if not bucket:
+                    del self.cells[(cx, cy)]
+
+    def _cell_range(self, min_x: float, min_y: float, max_x: float, max_y: float):
+        size = self.cell_size
+        return (int(min_x // size), int(min_y // size), int(max_x // size), int(max_y // size))
+
+    def _forget_picks(self, cell_range):
+        left, top, right, bottom = cell_range
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                self._picks.pop((cx, cy), None)
+
+    def _flush(self):
+        for polygon in self._dirty:
+            bounds = polygon.bounds()
+            slot = self._slots[polygon]
+            self._bounds[slot] = bounds
+            cell_range = self._cell_range(*bounds)
+            if self._cells_of.get(polygon) == cell_range:
+                if self._picks:
+                    self._forget_picks(cell_range)
+                continue
+
+            self._unlink(polygon)
+            left, top, right, bottom = cell_range
+            for cx in range(left, right + 1):
+                for cy in range(top, bottom + 1):
+                    self.cells.setdefault((cx, cy), set()).add(slot)
+                    self._picks.pop((cx, cy), None)
+            self._cells_of[polygon] = cell_range
+        self._dirty.clear()
+
+    def _ordered(self, slots, reverse: bool = False):
+        slots = np.fromiter(slots, dtype=np.int64, count=len(slots))
+        ranks = self._ranks[slots]
+        return slots[np.argsort(-ranks if reverse else ranks)]
+
+    def query_point(self, x: float, y: float):
+        # Кандидаты без порядка; верхнюю фигуру под точкой дает pick()
+        self._flush()
+        bucket = self.cells.get((int(x // self.cell_size), int(y // self.cell_size)), ())
+        return [self._polygons[slot] for slot in bucket]
+
+    def pick(self, x: float, y: float):
+        self._flush()
+        cell = (int(x // self.cell_size), int(y // self.cell_size))
+        entry = self._picks.get(cell)
+        if entry is None:
+            bucket = self.cells.get(cell)
+            if not bucket:
+                return None
+            slots = self._ordered(bucket, reverse=True)
+            entry = self._picks[cell] = (slots, self._bounds[slots])
+
+        # Рамки проверяются разом, точная проверка - сверху вниз до первого попадания
+        slots, bounds = entry
+        hits = (bounds[:, 0] <= x) & (x <= bounds[:, 2]) & (bounds[:, 1] <= y) & (y <= bounds[:, 3])
+        for slot in slots[hits].tolist():
+            polygon = self._polygons[slot]
+            if polygon.contains_point(x, y):
+                return polygon
+        return None
+
+    def query_rect(self, rect):
+        self._flush()
+        left, top, right, bottom = self._cell_range(rect.left, rect.top, rect.right, rect.bottom)
+        found = set()
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket:
+                    found.update(bucket)
+        return [self._polygons[slot] for slot in self._ordered(found).tolist()]
+
+
+class Scene:
     def __init__(self):
+        self._items = {}
+        self._ids = {}
+        self._next = {}
+        self._prev = {}
+        self._head = None
+        self._tail = None
+        self._next_id = 0
+
+    def add(self, polygon) -> int:
+        item_id = self._next_id
+        self._next_id += 1
+        self._items[item_id] = polygon
+        self._ids[polygon] = item_id
+        self._prev[item_id] = self._tail
+        self._next[item_id] = None
+        if self._tail is None:
+            self._head = item_id
+        else:
+            self._next[self._tail] = item_id
+        self._tail = item_id
+        return item_id
+
+    def extend(self, polygons):
+        polygons = list(polygons)
+        first = self._next_id
+        ids = range(first, first + len(polygons))
+        if not polygons:
+            return ids
+
+        self._next_id += len(polygons)
+        self._items.update(zip(ids, polygons))
+        self._ids.update(zip(polygons, ids))
+        self._prev.update(zip(ids, [self._tail, *ids[:-1]]))
+        self._next.update(zip(ids, [*ids[1:], None]))
+        if self._tail is None:
+            self._head = first
+        else:
+            self._next[self._tail] = first
+        self._tail = ids[-1]
+        return ids
+
+    def remove(self, polygon):
+        item_id = self._ids.pop(polygon)
+        del self._items[item_id]
+        prev_id = self._prev.pop(item_id)
+        next_id = self._next.pop(item_id)
+        if prev_id is None:
+            self._head = next_id
+        else:
+            self._next[prev_id] = next_id
+        if next_id is None:
+            self._tail = prev_id
+        else:
+            self._prev[next_id] = prev_id
+
+    def id_of(self, polygon) -> int:
+        return self._ids[polygon]
+
+    def get(self, item_id: int):
+        return self._items.get(item_id)
+
+    def first(self):
+        return None if self._head is None else self._items[self._head]
+
+    def next_after(self, polygon):
+        next_id = self._next[self._ids[polygon]]
+        return self._items[self._head if next_id is None else next_id]
+
+    def __contains__(self, polygon) -> bool:
+        return polygon in self._ids
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items.values())
+
+    def __reversed__(self):
+        return reversed(self._items.values())
+
+
+class Camera:
+    # Вид на мир: (x, y) - мировая точка в левом верхнем углу экрана,
+    # масштаб дискретный, чтобы спрайты стрелок переиспользовались
+    def __init__(self):
+        self.x = 0.0
+        self.y = 0.0
+        self.zoom_level = 0
+
+    @property
+    def zoom(self) -> float:
+        return ZOOM_STEP ** self.zoom_level
+
+    def to_screen(self, points):
+        return (points - (self.x, self.y)) * self.zoom
+
+    def to_world(self, screen_x: float, screen_y: float):
+        zoom = self.zoom
+        return screen_x / zoom + self.x, screen_y / zoom + self.y
+
+    def screen_rect(self, bounds):
+        min_x, min_y, max_x, max_y = bounds
+        zoom = self.zoom
+        left, top = math.floor((min_x - self.x) * zoom), math.floor((min_y - self.y) * zoom)
+        right, bottom = math.ceil((max_x - self.x) * zoom), math.ceil((max_y - self.y) * zoom)
+        return pygame.Rect(left, top, right - left, bottom - top)
+
+    def world_rect(self, rect):
+        min_x, min_y = self.to_world(rect.left, rect.top)
+        max_x, max_y = self.to_world(rect.right, rect.bottom)
+        left, top = math.floor(min_x), math.floor(min_y)
+        return pygame.Rect(left, top, math.ceil(max_x) - left, math.ceil(max_y) - top)
+
+    def pan(self, screen_dx: float, screen_dy: float):
+        zoom = self.zoom
+        self.x -= screen_dx / zoom
+        self.y -= screen_dy / zoom
+
+    def zoom_at(self, steps: int, screen_x: float, screen_y: float) -> bool:
+        level = max(MIN_ZOOM_LEVEL, min(MAX_ZOOM_LEVEL, self.zoom_level + steps))
+        if level == self.zoom_level:
+            return False
+
+        # Точка мира под курсором остается на месте
+        world_x, world_y = self.to_world(screen_x, screen_y)
+        self.zoom_level = level
+        self.x = world_x - screen_x / self.zoom
+        self.y = world_y - screen_y / self.zoom
+        return True
+
+    def reset(self):
+        self.x = 0.0
+        self.y = 0.0
+        self.zoom_level = 0
+
+
+class Painter:
+    def __init__(self, scene_file: str = SCENE_FILE):
         self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
         pygame.display.set_caption("Painter")
+        self.scene_file = scene_file
         self.clock = pygame.time.Clock()
         self.font = pygame.font.SysFont('Arial', 16)
 
-        self.polygons = []
+        self.background = pygame.Surface((WIDTH, HEIGHT)).convert()
+        self.background.fill(WHITE)
+        self.frame = self.background.copy()
+        self.dirty_rects = [self.screen.get_rect()]
+
+        self.pool = POINT_POOL
+        self.polygons = Scene()
+        self.spatial_index = SpatialGrid()
+        self.camera = Camera()
+        self.panning = False
+        self.selection = set()
+        self.shared_pivot = True
+        self.band_start = None
+        self.band_rect = None
         self.create_arrow()
         self.selected_polygon = None
 
@@ -189,101 +1048,297 @@ class Painter:
         self.translation_step = 5
         self.show_menu = True
 
+        self.menu_items = [
+            "M - Показать/скрыть меню",
+            "N - Создать новую фигуру",
+            "TAB - Выбрать следующую фигуру",
+            "DELETE - Удалить выбранные фигуры",
+            "",
+            "R - Поворот по часовой (+5°)",
+            "Shift+R - Поворот против часовой (-5°)",
+            "Стрелки - Перенос фигуры",
+            "P - Поворот группы: общий центр / свои точки",
+            "",
+            "ЛКМ - Выбрать фигуру",
+            "Shift+ЛКМ - Добавить/убрать из выделения",
+            "ЛКМ по пустому месту - Выделение рамкой",
+            "ПКМ - Перемещение вида, колесо - масштаб",
+            "HOME - Сбросить вид",
+            "Ctrl+S / Ctrl+L - Сохранить / загрузить сцену",
+        ]
+        self.text_cache = SpriteCache(TEXT_CACHE_SIZE)
+        self.menu_surface = self.compose_lines(self.menu_items)
+        self.menu_rect = self.menu_surface.get_rect(topleft=(10, 10))
+        self.status_rect = pygame.Rect(0, HEIGHT - 30, WIDTH, 30)
+        self.status = None
+        self.animating = False
+
+    def invalidate(self, rect):
+        self.dirty_rects.append(pygame.Rect(rect))
+
+    def invalidate_polygon(self, polygon):
+        self.invalidate(self.camera.screen_rect(polygon.bounds()).inflate(2 * DIRTY_MARGIN, 2 * DIRTY_MARGIN))
+
+    def invalidate_view(self):
+        self.invalidate(self.screen.get_rect())
+
+    def set_selected(self, polygon, selected: bool):
+        polygon.selected = selected
+        if selected:
+            self.selection.add(polygon)
+        else:
+            self.selection.discard(polygon)
+        self.invalidate_polygon(polygon)
+
+    def clear_selection(self):
+        for polygon in list(self.selection):
+            self.set_selected(polygon, False)
+
+    def targets(self):
+        if self.selection:
+            return list(self.selection)
+        return [self.selected_polygon] if self.selected_polygon else []
+
+    def transform_targets(self, angle_degrees: float = 0, dx: float = 0, dy: float = 0):
+        targets = self.targets()
+        if not targets:
+            return
+
+        pivot = None
+        if angle_degrees and self.shared_pivot and len(targets) > 1:
+            bounds = np.array([polygon.bounds() for polygon in targets])
+            pivot = ((bounds[:, 0].min() + bounds[:, 2].max()) / 2, (bounds[:, 1].min() + bounds[:, 3].max()) / 2)
+
+        for polygon in targets:
+            self.invalidate_polygon(polygon)
+        transform_group(targets, angle_degrees, dx, dy, pivot)
+        for polygon in targets:
+            self.spatial_index.update(polygon)
+            self.invalidate_polygon(polygon)
+
     def create_arrow(self):
-        center_x, center_y = WIDTH // 2, HEIGHT // 2
+        center_x, center_y = self.camera.to_world(WIDTH // 2, HEIGHT // 2)
         arrow_size = 80
-        arrow = Arrow(center_x, center_y, arrow_size)
-        self.polygons.append(arrow)
+        arrow = Arrow(center_x, center_y, arrow_size, self.pool)
+        self.spatial_index.insert(arrow, self.polygons.add(arrow))
+        self.invalidate_polygon(arrow)
+        self.clear_selection()
         self.selected_polygon = arrow
 
+    def save_scene(self):
+        try:
+            save_scene(self.scene_file, self.polygons)
+        except OSError as e:
+            print(f"Не удалось сохранить сцену: {e}")
+            return
+        print(f"Сцена сохранена в {self.scene_file}: фигур {len(self.polygons)}")
+
+    def load_scene(self):
+        try:
+            started = time.perf_counter()
+            # Сцена заменяется целиком, поэтому грузится в новый пул: старый
+            # уходит вместе со старыми фигурами, а не копит освобожденные блоки
+            pool = PointPool()
+            polygons = load_scene(self.scene_file, pool)
+        except (OSError, ValueError) as e:
+            print(f"Не удалось загрузить сцену: {e}")
+            return
+
+        for polygon in self.polygons:
+            polygon.release()
+        self.pool = pool
+        self.polygons = Scene()
+        self.spatial_index = SpatialGrid()
+        self.selection.clear()
+        self.selected_polygon = None
+        self.spatial_index.insert_many(polygons, self.polygons.extend(polygons))
+        self.invalidate_view()
+        print(f"Сцена загружена из {self.scene_file}: фигур {len(polygons)} за {time.perf_counter() - started:.2f} с")
+
+    def poll_events(self):
+        if self.animating:
+            return pygame.event.get()
+
+        # В режиме простоя цикл спит до первого события, а накопившиеся
+        # за это время события (автоповтор клавиш) обрабатываются за один кадр
+        event = pygame.event.wait(IDLE_TIMEOUT_MS)
+        return [event] + pygame.event.get()
+
     def handle_events(self):
-        for event in pygame.event.get():
+        for event in self.poll_events():
             if event.type == pygame.QUIT:
                 return False
 
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                self.invalidate_view()
+
             if event.type == pygame.KEYDOWN:
                 self.handle_keyboard_events(event)
 
             if event.type == pygame.MOUSEBUTTONDOWN:
                 self.handle_mouse_events(event)
 
+            if event.type == pygame.MOUSEMOTION:
+                self.handle_mouse_motion(event)
+
+            if event.type == pygame.MOUSEBUTTONUP:
+                self.handle_mouse_release(event)
+
+            if event.type == pygame.MOUSEWHEEL:
+                if self.camera.zoom_at(event.y, *pygame.mouse.get_pos()):
+                    self.invalidate_view()
+
         return True
 
     def handle_keyboard_events(self, event):
         if event.key == pygame.K_m:
             self.show_menu = not self.show_menu
+            self.invalidate(self.menu_rect)
 
         elif event.key == pygame.K_n:
             self.create_arrow()
 
         elif event.key == pygame.K_TAB:
+            self.clear_selection()
             if self.polygons:
                 if self.selected_polygon in self.polygons:
-                    current_index = self.polygons.index(self.selected_polygon)
-                    next_index = (current_index + 1) % len(self.polygons)
+                    self.selected_polygon = self.polygons.next_after(self.selected_polygon)
                 else:
-                    next_index = 0
-                self.selected_polygon = self.polygons[next_index]
+                    self.selected_polygon = self.polygons.first()
 
         elif event.key == pygame.K_DELETE:
-            if self.selected_polygon in self.polygons:
-                self.polygons.remove(self.selected_polygon)
-                self.selected_polygon = self.polygons[0] if self.polygons else None
+            for polygon in self.targets():
+                if polygon in self.polygons:
+                    self.invalidate_polygon(polygon)
+                    self.polygons.remove(polygon)
+                    self.spatial_index.remove(polygon)
+                    polygon.release()
+            self.selection.clear()
+            self.selected_polygon = self.polygons.first()
 
-        if self.selected_polygon:
-            if event.key == pygame.K_r:
-                if pygame.key.get_mods() & pygame.KMOD_SHIFT:
-                    self.selected_polygon.rotate(-self.rotation_step)
-                else:
-                    self.selected_polygon.rotate(self.rotation_step)
+        elif event.key == pygame.K_s and pygame.key.get_mods() & pygame.KMOD_CTRL:
+            self.save_scene()
+
+        elif event.key == pygame.K_l and pygame.key.get_mods() & pygame.KMOD_CTRL:
+            self.load_scene()
+
+        elif event.key == pygame.K_p:
+            self.shared_pivot = not self.shared_pivot
+
+        elif event.key == pygame.K_HOME:
+            self.camera.reset()
+            self.invalidate_view()
 
-            elif event.key == pygame.K_UP:
-                self.selected_polygon.translate(0, -self.translation_step)
-            elif event.key == pygame.K_DOWN:
-                self.selected_polygon.translate(0, self.translation_step)
-            elif event.key == pygame.K_LEFT:
-                self.selected_polygon.translate(-self.translation_step, 0)
-            elif event.key == pygame.K_RIGHT:
-                self.selected_polygon.translate(self.translation_step, 0)
+        elif event.key == pygame.K_r:
+            if pygame.key.get_mods() & pygame.KMOD_SHIFT:
+                self.transform_targets(-self.rotation_step)
+            else:
+                self.transform_targets(self.rotation_step)
+
+        elif event.key == pygame.K_UP:
+            self.transform_targets(dy=-self.translation_step)
+        elif event.key == pygame.K_DOWN:
+            self.transform_targets(dy=self.translation_step)
+        elif event.key == pygame.K_LEFT:
+            self.transform_targets(dx=-self.translation_step)
+        elif event.key == pygame.K_RIGHT:
+            self.transform_targets(dx=self.translation_step)
 
     def handle_mouse_events(self, event):
         if event.button == 1:
             mouse_pos = pygame.mouse.get_pos()
+            world_pos = self.camera.to_world(*mouse_pos)
+            additive = pygame.key.get_mods() & pygame.KMOD_SHIFT
 
-            for polygon in reversed(self.polygons):
-                if polygon.get_bounding_rect().collidepoint(mouse_pos):
-                    if self.selected_polygon:
-                        self.selected_polygon.selected = False
-
-                    polygon.selected = True
+            polygon = self.spatial_index.pick(*world_pos)
+            if polygon is not None:
+                if additive:
+                    self.set_selected(polygon, not polygon.selected)
+                elif not polygon.selected:
+                    self.clear_selection()
+                    self.set_selected(polygon, True)
+                if polygon.selected:
                     self.selected_polygon = polygon
-                    break
+                elif self.selected_polygon is polygon:
+                    # Снятая с выделения фигура не должна оставаться целью клавиш
+                    self.selected_polygon = next(iter(self.selection), None)
+            else:
+                # Клик мимо фигур начинает выделение рамкой
+                if not additive:
+                    self.selected_polygon = None
+                self.band_start = mouse_pos
+                self.band_rect = pygame.Rect(mouse_pos, (0, 0))
+                self.animating = True
+
+        elif event.button in (2, 3):
+            self.panning = True
+            self.animating = True
+
+    def handle_mouse_motion(self, event):
+        if self.band_start:
+            self.update_band(event.pos)
+        elif self.panning and event.rel != (0, 0):
+            self.camera.pan(*event.rel)
+            self.invalidate_view()
+
+    def handle_mouse_release(self, event):
+        if event.button == 1 and self.band_start:
+            self.finish_band(event.pos)
+        elif event.button in (2, 3) and self.panning:
+            self.panning = False
+            self.animating = False
+
+    def update_band(self, pos):
+        self.invalidate(self.band_rect.inflate(2, 2))
+        left, right = sorted((self.band_start[0], pos[0]))
+        top, bottom = sorted((self.band_start[1], pos[1]))
+        self.band_rect = pygame.Rect(left, top, right - left, bottom - top)
+        self.invalidate(self.band_rect.inflate(2, 2))
+
+    def finish_band(self, pos):
+        self.update_band(pos)
+        self.invalidate(self.band_rect.inflate(2, 2))
 
-    def draw_menu(self):
+        if not pygame.key.get_mods() & pygame.KMOD_SHIFT:
+            self.clear_selection()
+        for polygon in self.spatial_index.query_rect(self.camera.world_rect(self.band_rect)):
+            if self.band_rect.contains(self.camera.screen_rect(polygon.bounds())):
+                self.set_selected(polygon, True)
+                self.selected_polygon = polygon
+        if self.selected_polygon not in self.selection:
+            self.selected_polygon = next(iter(self.selection), None)
+
+        self.band_start = None
+        self.band_rect = None
+        self.animating = False
+
+    def render_text(self, text: str, color=BLACK, antialias: bool = True):
+        key = (text, color, antialias)
+        return self.text_cache.get(key, lambda: self.font.render(text, antialias, color))
+
+    def compose_lines(self, lines):
+        # Меню собирается в одну поверхность, чтобы в кадре был один blit
+        rendered = [self.render_text(line) for line in lines]
+        width = max(text.get_width() for text in rendered)
+        block = pygame.Surface((width, MENU_LINE_HEIGHT * len(lines)), pygame.SRCALPHA)
+        for i, text in enumerate(rendered):
+            block.blit(text, (0, i * MENU_LINE_HEIGHT))
+        block.set_alpha(255, pygame.RLEACCEL)
+        return block
+
+    def draw_menu(self, surface):
         if not self.show_menu:
             return
 
-        menu_items = [
-            "M - Показать/скрыть меню",
-            "N - Создать новую фигуру",
-            "TAB - Выбрать следующую фигуру",
-            "DELETE - Удалить выбранную фигуру",
-            "",
-            "R - Поворот по часовой (+5°)",
-            "Shift+R - Поворот против часовой (-5°)",
-            "Стрелки - Перенос фигуры",
-            "",
-            "ЛКМ - Выбрать фигуру",
-        ]
-
-        y_offset = 10
-        for item in menu_items:
-            text = self.font.render(item, True, BLACK)
-            self.screen.blit(text, (10, y_offset))
-            y_offset += 25
+        surface.blit(self.menu_surface, self.menu_rect)
 
-    def draw_status(self):
+    def status_text(self):
         status = f"Фигур на холсте: {len(self.polygons)}"
+        if self.camera.zoom_level:
+            status += f" | Масштаб: {self.camera.zoom:.0%}"
+        if len(self.selection) > 1:
+            pivot = "общий центр" if self.shared_pivot else "свои точки"
+            status += f" | Выделено: {len(self.selection)} (поворот: {pivot})"
         if self.selected_polygon:
             status += " | Выбрана фигура"
             
@@ -307,29 +1362,68 @@ class Painter:
             elif 270 < angle < 360:
                 status += " (вправо-вниз)"
 
-        text = self.font.render(status, True, BLACK)
-        self.screen.blit(text, (10, HEIGHT - 30))
+        return status
+
+    def draw_status(self, surface):
+        surface.blit(self.render_text(self.status), (10, HEIGHT - 30))
+
+    def update_status(self):
+        status = self.status_text()
+        if status != self.status:
+            self.status = status
+            self.invalidate(self.status_rect)
+
+    def render(self):
+        if not self.dirty_rects:
+            return
+
+        screen_rect = self.screen.get_rect()
+        rects = [rect.clip(screen_rect) for rect in self.dirty_rects]
+        if len(rects) > MAX_DIRTY_RECTS:
+            rects = [rects[0].unionall(rects[1:])]
+        self.dirty_rects = []
+
+        # pygame растрирует толстые линии по-разному с set_clip и без него,
+        # поэтому фигуры рисуются без отсечения в буфер, а на экран
+        # копируются только грязные области
+        for rect in rects:
+            if not rect:
+                continue
+            self.frame.blit(self.background, rect, rect)
+
+            # Фигуры вне видимой области не попадают в выборку сетки
+            visible = self.camera.world_rect(rect.inflate(2 * DIRTY_MARGIN, 2 * DIRTY_MARGIN))
+            for polygon in self.spatial_index.query_rect(visible):
+                polygon.draw(self.frame, self.camera)
+
+            if self.band_rect and self.band_rect.inflate(2, 2).colliderect(rect):
+                pygame.draw.rect(self.frame, BAND_COLOR, self.band_rect, 1)
+
+            if self.show_menu and self.menu_rect.colliderect(rect):
+                self.draw_menu(self.frame)
+            if self.status_rect.colliderect(rect):
+                self.draw_status(self.frame)
+
+            self.screen.blit(self.frame, rect, rect)
+
+        pygame.display.update(rects)
 
     def run(self):
         running = True
         while running:
             running = self.handle_events()
 
-            self.screen.fill(WHITE)
-
-            for polygon in self.polygons:
-                polygon.draw(self.screen)
-
-            self.draw_menu()
-            self.draw_status()
+            self.update_status()
+            self.render()
 
-            pygame.display.flip()
-            self.clock.tick(60)
+            self.clock.tick(FPS)
 
         pygame.quit()
         sys.exit()
 
 
 if __name__ == "__main__":
-    app = Painter()
+    app = Painter(sys.argv[1] if len(sys.argv) > 1 else SCENE_FILE)
+    if len(sys.argv) > 1:
+        app.load_scene()
     app.run()
\ No newline at end of file
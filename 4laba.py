@@ -2,6 +2,7 @@ import pygame
 import math
 import sys
 import os
+from collections import OrderedDict
 from typing import List, Tuple, Optional
 
 # Инициализация Pygame
@@ -15,16 +16,78 @@ RED = (255, 0, 0)
 BLUE = (0, 0, 255)
 GREEN = (0, 255, 0)
 GRAY = (200, 200, 200)
+FPS = 60
+IDLE_TIMEOUT_MS = 500
+TEXT_CACHE_SIZE = 128
+PATTERN_CACHE_SIZE = 32
+PATTERN_CACHE_BYTES = 32 * 1024 * 1024
+MIN_PATTERN_SIZE = 64
+SCALED_CACHE_SIZE = 8
+MIN_MIPMAP_SIZE = 8
+MENU_LINE_HEIGHT = 25
+
+
+class SurfaceCache:
+    """Кэш готовых поверхностей с вытеснением давно не использованных (LRU)"""
+
+    def __init__(self, capacity: int, max_bytes: int = None):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+
+    def get(self, key, build):
+        """Возвращает поверхность по ключу, при промахе создает ее через build()"""
+        surface = self.entries.get(key)
+        if surface is None:
+            surface = build()
+            self.entries[key] = surface
+            self.bytes += surface_bytes(surface)
+            self.evict()
+        else:
+            self.entries.move_to_end(key)
+        return surface
+
+    def evict(self):
+        """Вытеснение старых записей сверх лимита по числу и по объему (последняя остается)"""
+        while len(self.entries) > 1 and (len(self.entries) > self.capacity or
+                                         (self.max_bytes is not None and self.bytes > self.max_bytes)):
+            _, surface = self.entries.popitem(last=False)
+            self.bytes -= surface_bytes(surface)
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+
+def surface_bytes(surface: pygame.Surface) -> int:
+    """Объем пикселей поверхности в байтах"""
+    return surface.get_pitch() * surface.get_height()
+
+
+def pattern_size(size: int) -> int:
+    """Размер плитки из кэша: ближайшая сверху степень двойки"""
+    return max(MIN_PATTERN_SIZE, 1 << max(0, size - 1).bit_length())
+
+
+# Общий кэш замощенных узоров для всех кистей и фигур
+PATTERN_CACHE = SurfaceCache(PATTERN_CACHE_SIZE, PATTERN_CACHE_BYTES)
 
 
 class BitmapResource:
     """Класс для работы с растровыми ресурсами"""
 
-    def __init__(self, filename: str = None):
+    def __init__(self, filename: str = None, mipmaps: bool = False):
         self.image = None
         self.original_image = None
         self.filename = filename
         self.loaded = False
+        self.revision = 0  # Меняется при замене изображения, входит в ключи кэшей
+        # Масштабированные копии по размеру: image всегда равно original_image,
+        # приведенному к своему размеру, поэтому ключа (откуда, куда) достаточно
+        self.variants = SurfaceCache(SCALED_CACHE_SIZE)
+        self.use_mipmaps = mipmaps
+        self.mipmaps = None
 
         if filename and os.path.exists(filename):
             self.load_from_file(filename)
@@ -36,6 +99,9 @@ class BitmapResource:
             self.original_image = self.image.copy()
             self.filename = filename
             self.loaded = True
+            self.revision += 1
+            self.variants.clear()
+            self.mipmaps = None
             print(f"Изображение загружено: {filename}")
         except pygame.error as e:
             print(f"Ошибка загрузки изображения: {e}")
@@ -47,9 +113,8 @@ class BitmapResource:
             return
 
         if width is not None and height is not None:
-            # Масштабирование изображения
-            scaled_image = pygame.transform.scale(self.image, (width, height))
-            surface.blit(scaled_image, (x, y))
+            # Масштабированная копия берется из кэша
+            surface.blit(self.scaled(self.image, width, height), (x, y))
         else:
             # Вывод в оригинальном размере
             surface.blit(self.image, (x, y))
@@ -57,7 +122,39 @@ class BitmapResource:
     def scale(self, width: int, height: int):
         """Масштабирование изображения"""
         if self.loaded and self.original_image:
-            self.image = pygame.transform.scale(self.original_image, (width, height))
+            self.image = self.scaled(self.original_image, width, height)
+            self.mipmaps = None
+            self.revision += 1
+
+    def scaled(self, source: pygame.Surface, width: int, height: int) -> pygame.Surface:
+        """Копия source размером width x height из кэша вариантов"""
+        if source.get_size() == (width, height):
+            return source
+        key = (source is self.original_image, source.get_size(), width, height)
+        return self.variants.get(key, lambda: self.build_scaled(source, width, height))
+
+    def build_scaled(self, source: pygame.Surface, width: int, height: int) -> pygame.Surface:
+        """Масштабирование; уменьшение текущего изображения идет через пирамиду"""
+        if (self.use_mipmaps and source is self.image and
+                width < source.get_width() and height < source.get_height()):
+            # Ближайший сверху уровень пирамиды, затем сглаженное уменьшение
+            level = source
+            for mipmap in self.mipmap_levels():
+                if mipmap.get_width() < width or mipmap.get_height() < height:
+                    break
+                level = mipmap
+            return pygame.transform.smoothscale(level, (width, height))
+        return pygame.transform.scale(source, (width, height))
+
+    def mipmap_levels(self) -> List[pygame.Surface]:
+        """Пирамида уменьшенных вдвое копий текущего изображения (строится один раз)"""
+        if self.mipmaps is None:
+            self.mipmaps = []
+            level = self.image
+            while min(level.get_size()) // 2 >= MIN_MIPMAP_SIZE:
+                level = pygame.transform.smoothscale(level, (level.get_width() // 2, level.get_height() // 2))
+                self.mipmaps.append(level)
+        return self.mipmaps
 
     def get_width(self) -> int:
         """Получить ширину изображения"""
@@ -72,18 +169,60 @@ class BitmapResource:
         if not self.loaded:
             return pygame.Surface((pattern_width, pattern_height))
 
-        # Создаем поверхность для узора
-        pattern_surface = pygame.Surface((pattern_width, pattern_height), pygame.SRCALPHA)
+        tiled = self.tiled_pattern(pattern_width, pattern_height)
+        return tiled.subsurface((0, 0, pattern_width, pattern_height)).copy()
+
+    def tiled_pattern(self, min_width: int, min_height: int) -> pygame.Surface:
+        """Замощенный узор не меньше заданного размера из общего кэша (только для чтения)"""
+        width, height = pattern_size(min_width), pattern_size(min_height)
+        key = (self, self.revision, width, height)
+        return PATTERN_CACHE.get(key, lambda: self.build_tiled_pattern(width, height))
+
+    def build_tiled_pattern(self, width: int, height: int) -> pygame.Surface:
+        """Замощение удвоением: уже заполненная часть копируется рядом с собой"""
+        pattern_surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        pattern_surface.blit(self.image, (0, 0))
+
+        # Копии кладутся на прозрачный фон через MAX, то есть без повторного смешивания
+        filled_width, filled_height = min(self.get_width(), width), min(self.get_height(), height)
+        while filled_width < width:
+            chunk = pattern_surface.subsurface((0, 0, filled_width, filled_height)).copy()
+            pattern_surface.blit(chunk, (filled_width, 0), special_flags=pygame.BLEND_RGBA_MAX)
+            filled_width = min(2 * filled_width, width)
+        while filled_height < height:
+            chunk = pattern_surface.subsurface((0, 0, width, filled_height)).copy()
+            pattern_surface.blit(chunk, (0, filled_height), special_flags=pygame.BLEND_RGBA_MAX)
+            filled_height = min(2 * filled_height, height)
+
+        return pattern_surface
 
-        # Заполняем поверхность повторяющимся изображением
+    def create_pattern_region(self, rect: pygame.Rect) -> pygame.Surface:
+        """Узор для области rect с фазой, привязанной к началу координат экрана"""
         img_width = self.get_width()
         img_height = self.get_height()
+        tiled = self.tiled_pattern(rect.width + img_width, rect.height + img_height)
+        phase = pygame.Rect(rect.x % img_width, rect.y % img_height, rect.width, rect.height)
+        return tiled.subsurface(phase).copy()
+
+    def create_masked_pattern(self, points: List[Tuple[int, int]]) -> Tuple[Optional[pygame.Surface], pygame.Rect]:
+        """Узор, обрезанный по многоугольнику, и его положение на экране"""
+        # Поверхности занимают только ограничивающий прямоугольник фигуры
+        min_x = min(point[0] for point in points)
+        min_y = min(point[1] for point in points)
+        max_x = max(point[0] for point in points)
+        max_y = max(point[1] for point in points)
+        rect = pygame.Rect(min_x, min_y, max_x - min_x + 1, max_y - min_y + 1).clip(pygame.Rect(0, 0, WIDTH, HEIGHT))
+        if not rect.width or not rect.height:
+            return None, rect
+
+        mask_surface = pygame.Surface(rect.size, pygame.SRCALPHA)
+        mask_surface.fill((0, 0, 0, 0))
+        pygame.draw.polygon(mask_surface, (255, 255, 255, 255),
+                            [(x - rect.x, y - rect.y) for x, y in points])
 
-        for x in range(0, pattern_width, img_width):
-            for y in range(0, pattern_height, img_height):
-                pattern_surface.blit(self.image, (x, y))
-
-        return pattern_surface
+        pattern_surface = self.create_pattern_region(rect)
+        pattern_surface.blit(mask_surface, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
+        return pattern_surface, rect
 
 
 class PatternBrush:
@@ -98,21 +237,13 @@ class PatternBrush:
         if not self.pattern.loaded or len(shape_points) < 3:
             return False
 
-        # Создаем маску для фигуры
-        mask_surface = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-        mask_surface.fill((0, 0, 0, 0))
-
-        # Рисуем фигуру на маске
-        pygame.draw.polygon(mask_surface, (255, 255, 255, 255), shape_points)
-
-        # Создаем поверхность с узором
-        pattern_surface = self.pattern.create_pattern_surface(WIDTH, HEIGHT)
-
-        # Применяем маску к узору
-        pattern_surface.blit(mask_surface, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
+        # Узор с маской фигуры в пределах ее ограничивающего прямоугольника
+        pattern_surface, rect = self.pattern.create_masked_pattern(shape_points)
+        if pattern_surface is None:
+            return False
 
         # Рисуем результат на основной поверхности
-        surface.blit(pattern_surface, (0, 0))
+        surface.blit(pattern_surface, rect)
 
         return True
 
@@ -127,6 +258,7 @@ class Shape:
         self.pattern_filled = False
         self.pattern_texture = None  # Для хранения текстуры заливки
         self.pattern_surface = None  # Для хранения поверхности с узором
+        self.pattern_offset = (0, 0)  # Положение поверхности с узором на экране
 
     def draw(self, surface):
         """Рисование фигуры"""
@@ -135,7 +267,7 @@ class Shape:
 
         # Если фигура заполнена узором, рисуем текстуру
         if self.pattern_filled and self.pattern_surface:
-            surface.blit(self.pattern_surface, (0, 0))
+            surface.blit(self.pattern_surface, self.pattern_offset)
 
         # Иначе рисуем обычную заливку
         elif self.filled and len(self.points) > 2:
@@ -156,23 +288,9 @@ class Shape:
         self.pattern_filled = True
         self.pattern_texture = pattern_bitmap
 
-        # Создаем поверхность для узора
-        self.pattern_surface = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-        self.pattern_surface.fill((0, 0, 0, 0))
-
-        # Создаем маску для фигуры
-        mask_surface = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-        mask_surface.fill((0, 0, 0, 0))
-        pygame.draw.polygon(mask_surface, (255, 255, 255, 255), self.points)
-
-        # Создаем поверхность с узором
-        pattern_texture_surface = pattern_bitmap.create_pattern_surface(WIDTH, HEIGHT)
-
-        # Применяем маску к узору
-        pattern_texture_surface.blit(mask_surface, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
-
-        # Сохраняем результат
-        self.pattern_surface.blit(pattern_texture_surface, (0, 0))
+        # Сохраняем узор только в пределах фигуры вместе с его положением
+        self.pattern_surface, rect = pattern_bitmap.create_masked_pattern(self.points)
+        self.pattern_offset = rect.topleft
 
         return True
 
@@ -181,6 +299,7 @@ class Shape:
         self.pattern_filled = False
         self.pattern_texture = None
         self.pattern_surface = None
+        self.pattern_offset = (0, 0)
 
     def get_bounding_rect(self) -> pygame.Rect:
         """Получить ограничивающий прямоугольник"""
@@ -270,6 +389,18 @@ class Painter:
         # Флаги меню
         self.show_menu = True
 
+        # Перерисовка только по требованию
+        self.dirty = True
+
+        # Слой с готовыми фигурами: перестраивается только по invalidate_scene()
+        self.scene_layer = pygame.Surface((WIDTH, HEIGHT)).convert()
+        self.scene_dirty = True
+
+        # Кэш отрендеренного текста и собранный блок меню
+        self.text_cache = SurfaceCache(TEXT_CACHE_SIZE)
+        self.menu_surface = None
+        self.menu_lines = None
+
     def load_default_bitmaps(self):
         """Загрузка растровых ресурсов по умолчанию"""
         # Пытаемся загрузить изображения из файлов
@@ -277,7 +408,7 @@ class Painter:
 
         for filename in test_files:
             if os.path.exists(filename):
-                bitmap = BitmapResource(filename)
+                bitmap = BitmapResource(filename, mipmaps=True)
                 if bitmap.loaded:
                     self.bitmaps.append(bitmap)
 
@@ -333,16 +464,31 @@ class Painter:
 
         self.selected_shape = self.shapes[0]
 
+    def invalidate_scene(self):
+        """Пометить слой фигур для перестройки (фигура или ее заливка изменились)"""
+        self.scene_dirty = True
+
+    def poll_events(self):
+        """Получение пачки событий с блокировкой до первого из них"""
+        # Ждем первое событие, остальные накопившиеся обрабатываем за один кадр
+        event = pygame.event.wait(IDLE_TIMEOUT_MS)
+        return [event] + pygame.event.get()
+
     def handle_events(self):
-        for event in pygame.event.get():
+        for event in self.poll_events():
             if event.type == pygame.QUIT:
                 return False
 
             if event.type == pygame.KEYDOWN:
                 self.handle_keyboard_events(event)
+                self.dirty = True
 
             if event.type == pygame.MOUSEBUTTONDOWN:
                 self.handle_mouse_events(event)
+                self.dirty = True
+
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                self.dirty = True
 
         return True
 
@@ -365,6 +511,7 @@ class Painter:
                 new_shape.color = (150, 150, 255)
                 self.shapes.append(new_shape)
                 self.selected_shape = new_shape
+                self.invalidate_scene()
             self.creating_shape = False
             self.mode = "view"
 
@@ -379,15 +526,18 @@ class Painter:
             # Используем текущую текстуру из pattern_brush
             if self.pattern_brush.pattern and self.pattern_brush.pattern.loaded:
                 self.selected_shape.fill_with_pattern(self.pattern_brush.pattern)
+                self.invalidate_scene()
 
         # Очистка узора фигуры
         elif event.key == pygame.K_x and self.selected_shape:
             self.selected_shape.clear_pattern()
+            self.invalidate_scene()
 
         # Обычная заливка фигуры
         elif event.key == pygame.K_b and self.selected_shape:
             self.selected_shape.filled = not self.selected_shape.filled
             self.selected_shape.clear_pattern()  # Убираем узор при обычной заливке
+            self.invalidate_scene()
 
         # Выбор следующей фигуры
         elif event.key == pygame.K_TAB:
@@ -428,6 +578,20 @@ class Painter:
             if self.creating_shape and self.current_points:
                 self.current_points.pop()
 
+    def render_text(self, text: str, color=BLACK, antialias: bool = True) -> pygame.Surface:
+        """Рендер строки через кэш текстовых поверхностей"""
+        return self.text_cache.get((text, color, antialias), lambda: self.font.render(text, antialias, color))
+
+    def compose_lines(self, lines: List[str]) -> pygame.Surface:
+        """Сборка строк в одну поверхность с прозрачным фоном"""
+        rendered = [self.render_text(line) for line in lines]
+        width = max(text.get_width() for text in rendered)
+        block = pygame.Surface((width, MENU_LINE_HEIGHT * len(lines)), pygame.SRCALPHA)
+        for i, text in enumerate(rendered):
+            block.blit(text, (0, i * MENU_LINE_HEIGHT))
+        block.set_alpha(255, pygame.RLEACCEL)
+        return block
+
     def draw_menu(self):
         """Отрисовка меню управления"""
         if not self.show_menu:
@@ -457,11 +621,11 @@ class Painter:
             f"Режим: {'Создание фигуры' if self.creating_shape else 'Просмотр'}"
         ]
 
-        y_offset = 10
-        for item in menu_items:
-            text = self.font.render(item, True, BLACK)
-            self.screen.blit(text, (10, y_offset))
-            y_offset += 25
+        # Блок меню пересобирается только при изменении его строк (счетчики, режим)
+        if menu_items != self.menu_lines:
+            self.menu_surface = self.compose_lines(menu_items)
+            self.menu_lines = menu_items
+        self.screen.blit(self.menu_surface, (10, 10))
 
     def draw_status(self):
         """Отрисовка статусной строки"""
@@ -475,8 +639,7 @@ class Painter:
         if self.creating_shape:
             status += f" | Создание: {len(self.current_points)} точек"
 
-        text = self.font.render(status, True, BLACK)
-        self.screen.blit(text, (10, HEIGHT - 30))
+        self.screen.blit(self.render_text(status), (10, HEIGHT - 30))
 
     def draw_bitmap_previews(self):
         """Отрисовка превью растровых ресурсов"""
@@ -486,8 +649,7 @@ class Painter:
         x_offset = WIDTH - 150
         y_offset = 10
 
-        title = self.font.render("Текстуры кистей:", True, BLACK)
-        self.screen.blit(title, (x_offset, y_offset))
+        self.screen.blit(self.render_text("Текстуры кистей:"), (x_offset, y_offset))
         y_offset += 25
 
         for i, bitmap in enumerate(self.bitmaps):
@@ -499,51 +661,61 @@ class Painter:
             bitmap.draw(self.screen, x_offset, y_offset, 50, 50)
 
             # Номер текстуры
-            text = self.font.render(str(i + 1), True, BLACK)
-            self.screen.blit(text, (x_offset + 55, y_offset + 20))
+            self.screen.blit(self.render_text(str(i + 1)), (x_offset + 55, y_offset + 20))
 
             y_offset += 60
 
-    def run(self):
-        """Основной цикл программы"""
-        running = True
-        while running:
-            running = self.handle_events()
-
-            # Очистка экрана
-            self.screen.fill(WHITE)
+    def render_scene_layer(self):
+        """Перестройка слоя со всеми готовыми фигурами"""
+        self.scene_layer.fill(WHITE)
+        for shape in self.shapes:
+            shape.draw(self.scene_layer)
+        self.scene_dirty = False
+
+    def render(self):
+        """Отрисовка кадра"""
+        # Готовые фигуры берутся из слоя одним копированием
+        if self.scene_dirty:
+            self.render_scene_layer()
+        self.screen.blit(self.scene_layer, (0, 0))
+
+        # Подсветка выбранной фигуры
+        if self.selected_shape:
+            bounding_rect = self.selected_shape.get_bounding_rect()
+            pygame.draw.rect(self.screen, RED, bounding_rect, 2)
 
-            # Отрисовка всех фигур
-            for shape in self.shapes:
-                shape.draw(self.screen)
+        # Отрисовка создаваемой фигуры
+        if self.creating_shape and len(self.current_points) >= 2:
+            if len(self.current_points) == 2:
+                pygame.draw.line(self.screen, GREEN, self.current_points[0], self.current_points[1], 2)
+            else:
+                pygame.draw.polygon(self.screen, (200, 200, 200), self.current_points, 0)
+                pygame.draw.polygon(self.screen, GREEN, self.current_points, 2)
 
-                # Подсветка выбранной фигуры
-                if shape == self.selected_shape:
-                    bounding_rect = shape.get_bounding_rect()
-                    pygame.draw.rect(self.screen, RED, bounding_rect, 2)
+            # Рисуем точки
+            for point in self.current_points:
+                pygame.draw.circle(self.screen, BLUE, point, 4)
 
-            # Отрисовка создаваемой фигуры
-            if self.creating_shape and len(self.current_points) >= 2:
-                if len(self.current_points) == 2:
-                    pygame.draw.line(self.screen, GREEN, self.current_points[0], self.current_points[1], 2)
-                else:
-                    pygame.draw.polygon(self.screen, (200, 200, 200), self.current_points, 0)
-                    pygame.draw.polygon(self.screen, GREEN, self.current_points, 2)
+        # Отрисовка превью текстур
+        self.draw_bitmap_previews()
 
-                # Рисуем точки
-                for point in self.current_points:
-                    pygame.draw.circle(self.screen, BLUE, point, 4)
+        # Отрисовка меню и статуса
+        self.draw_menu()
+        self.draw_status()
 
-            # Отрисовка превью текстур
-            self.draw_bitmap_previews()
+        # Обновление экрана
+        pygame.display.flip()
 
-            # Отрисовка меню и статуса
-            self.draw_menu()
-            self.draw_status()
+    def run(self):
+        """Основной цикл программы"""
+        running = True
+        while running:
+            running = self.handle_events()
 
-            # Обновление экрана
-            pygame.display.flip()
-            self.clock.tick(60)
+            if self.dirty:
+                self.render()
+                self.dirty = False
+            self.clock.tick(FPS)
 
         pygame.quit()
         sys.exit()
@@ -0,0 +1,232 @@
+# Замеры производительности 2laba.py без окна (SDL_VIDEODRIVER=dummy).
+#
+#   python bench_2laba.py --output baseline.json
+#   python bench_2laba.py --baseline baseline.json
+#
+# Для каждого размера сцены печатается JSON с ops/s и p50/p99 одной операции;
+# при сравнении с базовым прогоном код возврата 1 означает регрессию.
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import platform
+import importlib.util
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+# Приветствие pygame иначе попадает в stdout перед JSON-отчетом
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+import numpy as np
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+MAX_SAMPLES = 5000
+FRAME_SAMPLES = 60
+ARROWS_PER_SCREEN = 200
+# Прогоны одного и того же дерева на общей машине расходятся до 4-5 раз
+# (вытеснение на соседние задачи), поэтому по умолчанию ловится только замедление в 5 раз;
+# на выделенной машине порог стоит задать меньше через --tolerance
+DEFAULT_TOLERANCE = 4.0
+BUILD_REPEATS = 3
+MIN_P99_SAMPLES = 100
+# p99 в единицы микросекунд упирается в разрешение таймера
+MIN_P99_MS = 0.01
+TIMING_ROUNDS = 3
+
+
+def load_painter_module(path: str):
+    spec = importlib.util.spec_from_file_location("laba2", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentile(sorted_samples, q: float):
+    index = min(len(sorted_samples) - 1, max(0, math.ceil(q / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def summarize(samples_ns, ops_per_sample: int = 1):
+    # Пропускная способность считается по медиане: одиночные выбросы (GC, планировщик)
+    # сильно сдвигают среднее
+    samples = sorted(samples_ns)
+    median = percentile(samples, 50) or 1
+    return {
+        "ops_per_sec": ops_per_sample / (median / 1e9),
+        "p50_ms": percentile(samples, 50) / 1e6,
+        "p99_ms": percentile(samples, 99) / 1e6,
+        "samples": len(samples),
+    }
+
+
+def timed(operation, arguments, ops_per_sample: int = 1):
+    # Первый вызов прогревает кэши (спрайты, отложенная перестройка сетки)
+    operation(*arguments[0])
+    # Каждая метрика - медиана по прогонам: один неудачный или удачный прогон ее не сдвигает
+    rounds = []
+    for _ in range(TIMING_ROUNDS):
+        samples = []
+        for args in arguments:
+            start = time.perf_counter_ns()
+            operation(*args)
+            samples.append(time.perf_counter_ns() - start)
+        rounds.append(summarize(samples, ops_per_sample))
+    return {name: percentile(sorted(metrics[name] for metrics in rounds), 50) for name in rounds[0]}
+
+
+def build_scene(laba, count: int, rng: random.Random):
+    # Плотность постоянна: мир растет вместе с числом стрелок,
+    # поэтому на экран попадает примерно ARROWS_PER_SCREEN фигур
+    scale = math.sqrt(max(1.0, count / ARROWS_PER_SCREEN))
+    width, height = laba.WIDTH * scale, laba.HEIGHT * scale
+
+    # Сцена строится несколько раз с одним зерном, чтобы у времени построения
+    # был разброс; дальше используется последняя
+    scene_seed = rng.getrandbits(64)
+    samples = []
+    arrows = []
+    for _ in range(BUILD_REPEATS):
+        for arrow in arrows:
+            arrow.release()
+        scene_rng = random.Random(scene_seed)
+        painter = laba.Painter()
+        arrows = []
+        start = time.perf_counter_ns()
+        for _ in range(count):
+            arrow = laba.Arrow(scene_rng.uniform(0, width), scene_rng.uniform(0, height), scene_rng.choice((30, 40, 50)))
+            arrow.rotate(laba.SPRITE_ANGLE_STEP * scene_rng.randrange(360 // laba.SPRITE_ANGLE_STEP))
+            painter.spatial_index.insert(arrow, painter.polygons.add(arrow))
+            arrows.append(arrow)
+        samples.append(time.perf_counter_ns() - start)
+    return painter, arrows, (width, height), summarize(samples, count)
+
+
+def sample(rng: random.Random, items, limit: int = MAX_SAMPLES):
+    return items if len(items) <= limit else rng.sample(items, limit)
+
+
+def bench_scene(laba, count: int, seed: int):
+    rng = random.Random(seed)
+    painter, arrows, (width, height), build = build_scene(laba, count, rng)
+    subset = sample(rng, arrows)
+    results = {"build": build}
+
+    results["calculate_points"] = timed(
+        lambda arrow: arrow.calculate_points(arrow.center_x, arrow.center_y, arrow.size),
+        [(arrow,) for arrow in subset])
+
+    # Поворот и сдвиг со сбросом кэша + пересчет рамки, как при нажатии клавиши
+    def transform(arrow):
+        arrow.transform_position(laba.SPRITE_ANGLE_STEP, 1, 1)
+        arrow.get_bounding_rect()
+
+    results["transform_position"] = timed(transform, [(arrow,) for arrow in subset])
+    results["get_bounding_rect"] = timed(lambda arrow: arrow.get_bounding_rect(), [(arrow,) for arrow in subset])
+
+    group = subset[:500]
+    results["group_transform"] = timed(
+        lambda: laba.transform_group(group, laba.SPRITE_ANGLE_STEP, 1, 1, (width / 2, height / 2)),
+        [()] * 50, len(group))
+    for arrow in subset + group:
+        painter.spatial_index.update(arrow)
+
+    # Тот же выбор верхней фигуры, что и по клику мыши в Painter.handle_mouse_events
+    points = [(rng.uniform(0, width), rng.uniform(0, height)) for _ in range(MAX_SAMPLES)]
+    results["hit_test"] = timed(painter.spatial_index.pick, points)
+
+    surface = pygame.Surface((laba.WIDTH, laba.HEIGHT)).convert()
+    visible = [arrow for arrow in subset if arrow.bounds()[2] < laba.WIDTH and arrow.bounds()[3] < laba.HEIGHT] or subset
+    visible = visible[:1000]
+    for arrow in visible:
+        arrow.draw(surface)
+    results["draw_sprite"] = timed(lambda arrow: arrow.draw(surface), [(arrow,) for arrow in visible])
+    results["draw_vector"] = timed(lambda arrow: laba.Polygon.draw(arrow, surface), [(arrow,) for arrow in visible])
+
+    def full_frame():
+        painter.invalidate_view()
+        painter.render()
+
+    painter.update_status()
+    full_frame()
+    results["frame_full"] = timed(full_frame, [()] * FRAME_SAMPLES)
+
+    # Кадр после переноса одной стрелки: перерисовываются только ее старая и новая области
+    moved = painter.polygons.first()
+    painter.selected_polygon = moved
+
+    def move_frame():
+        painter.transform_targets(0, 1, 0)
+        painter.render()
+
+    results["frame_move_one"] = timed(move_frame, [()] * FRAME_SAMPLES)
+    return results
+
+
+def compare(results, baseline, tolerance: float):
+    regressions = []
+    for size, benches in results.items():
+        for name, metrics in benches.items():
+            base = baseline.get(size, {}).get(name)
+            if not base:
+                continue
+            # Оба показателя сравниваются как замедление относительно базового прогона
+            if metrics["ops_per_sec"] * (1 + tolerance) < base["ops_per_sec"]:
+                regressions.append({"size": size, "bench": name, "metric": "ops_per_sec",
+                                    "baseline": base["ops_per_sec"], "current": metrics["ops_per_sec"]})
+            # По малой выборке p99 - это почти максимум, и он слишком шумный для сравнения
+            if (min(metrics["samples"], base["samples"]) >= MIN_P99_SAMPLES and base["p99_ms"] >= MIN_P99_MS and
+                    metrics["p99_ms"] > base["p99_ms"] * (1 + tolerance)):
+                regressions.append({"size": size, "bench": name, "metric": "p99_ms",
+                                    "baseline": base["p99_ms"], "current": metrics["p99_ms"]})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры производительности 2laba.py")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, metavar="N",
+                        help="число стрелок в сцене")
+    parser.add_argument("--seed", type=int, default=1, help="зерно генератора сцены")
+    parser.add_argument("--module", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "2laba.py"),
+                        help="путь к 2laba.py")
+    parser.add_argument("--output", metavar="FILE", help="сохранить результат в JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="сравнить с сохраненным прогоном")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="допустимое замедление относительно базового прогона (доля: 1.0 - вдвое медленнее)")
+    args = parser.parse_args()
+
+    laba = load_painter_module(args.module)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "video_driver": os.environ["SDL_VIDEODRIVER"],
+            "seed": args.seed,
+        },
+        "results": {},
+    }
+    for size in args.sizes:
+        report["results"][str(size)] = bench_scene(laba, size, args.seed)
+        print(f"{size} стрелок: готово", file=sys.stderr)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        report["regressions"] = compare(report["results"], baseline, args.tolerance)
+        status = 1 if report["regressions"] else 0
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    print(text)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())